@@ -0,0 +1,149 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Expose and summarize the metrics served by the cloud-controller-manager."""
+
+import json
+import logging
+import re
+import ssl
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+log = logging.getLogger(__name__)
+
+METRICS_PORT = 10258
+METRICS_URL = f"https://127.0.0.1:{METRICS_PORT}/metrics"
+SAMPLE_RE = re.compile(r"^(?P<name>[a-zA-Z_:][\w:]*)(?:\{(?P<labels>.*)\})?\s+(?P<value>\S+)")
+LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def scrape_job(token: str, ca: str) -> Dict:
+    """Prometheus scrape job reaching the controller on the host of every unit.
+
+    The controller authorizes the token of the metrics reader by delegating to the
+    api server, and serves a certificate signed by the cluster CA.
+    """
+    return {
+        "job_name": "cloud-controller-manager",
+        "metrics_path": "/metrics",
+        "scheme": "https",
+        "authorization": {"credentials": token},
+        # the prometheus charm writes the certificate to a file of its own
+        "tls_config": {"ca_file": ca},
+        "static_configs": [{"targets": [f"*:{METRICS_PORT}"]}],
+    }
+
+
+def scrape_app_data(charm, token: str, ca: str) -> Dict[str, str]:
+    """Application databag of the prometheus_scrape interface."""
+    metadata = {
+        "model": charm.model.name,
+        "model_uuid": charm.model.uuid,
+        "application": charm.app.name,
+        "charm_name": charm.meta.name,
+    }
+    return {
+        "scrape_metadata": json.dumps(metadata),
+        "scrape_jobs": json.dumps([scrape_job(token, ca)]),
+    }
+
+
+def scrape_unit_data(charm, relation) -> Dict[str, str]:
+    """Unit databag of the prometheus_scrape interface."""
+    binding = charm.model.get_binding(relation)
+    address = binding.network.ingress_address if binding else None
+    return {
+        "prometheus_scrape_unit_address": str(address or ""),
+        "prometheus_scrape_unit_name": charm.unit.name,
+    }
+
+
+def parse(text: str) -> Iterator[Sample]:
+    """Parse samples from the prometheus text exposition format."""
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        if m := SAMPLE_RE.match(line):
+            labels = dict(LABEL_RE.findall(m.group("labels") or ""))
+            try:
+                yield m.group("name"), labels, float(m.group("value"))
+            except ValueError:
+                continue
+
+
+def _total(samples: List[Sample], metric: str, **labels: str) -> float:
+    return sum(
+        value
+        for name, tags, value in samples
+        if name == metric and all(tags.get(k) == v for k, v in labels.items())
+    )
+
+
+def _mean(samples: List[Sample], histogram: str, **labels: str) -> Optional[float]:
+    count = _total(samples, f"{histogram}_count", **labels)
+    return _total(samples, f"{histogram}_sum", **labels) / count if count else None
+
+
+def _ms(seconds: Optional[float]) -> str:
+    return "-" if seconds is None else f"{seconds * 1000:.0f}ms"
+
+
+@dataclass
+class MetricsSummary:
+    """Where the controller spends its time while reconciling services.
+
+    Latencies are means in seconds since the controller started, None without samples.
+    """
+
+    gce_latency: Optional[float] = None
+    gce_errors: float = 0
+    queue_depth: float = 0
+    queue_latency: Optional[float] = None
+    sync_latency: Optional[float] = None
+    kube_latency: Optional[float] = None
+
+    @classmethod
+    def from_text(cls, text: str) -> "MetricsSummary":
+        """Summarize the controller metrics."""
+        samples = list(parse(text))
+        return cls(
+            gce_latency=_mean(samples, "cloudprovider_gce_api_request_duration_seconds"),
+            gce_errors=_total(samples, "cloudprovider_gce_api_request_errors"),
+            queue_depth=_total(samples, "workqueue_depth", name="service"),
+            queue_latency=_mean(samples, "workqueue_queue_duration_seconds", name="service"),
+            sync_latency=_mean(
+                samples, "service_controller_update_loadbalancer_host_latency_seconds"
+            ),
+            kube_latency=_mean(samples, "rest_client_request_duration_seconds"),
+        )
+
+    def __str__(self) -> str:
+        """Short summary, example 'gce 350ms 0 err, queue 2 wait 15ms, lb 1200ms, kube 8ms'."""
+        return (
+            f"gce {_ms(self.gce_latency)} {self.gce_errors:.0f} err, "
+            f"queue {self.queue_depth:.0f} wait {_ms(self.queue_latency)}, "
+            f"lb {_ms(self.sync_latency)}, kube {_ms(self.kube_latency)}"
+        )
+
+
+def scrape(
+    token: str, ca: str, url: str = METRICS_URL, timeout: float = 5.0
+) -> Optional[MetricsSummary]:
+    """Summarize the metrics of the controller on this host, None if they can't be read.
+
+    The token must be authorized to read /metrics, the certificate of the controller
+    is verified with the PEM encoded `ca`.
+    """
+    headers = {"Authorization": f"Bearer {token}"}
+    try:
+        verify = ssl.create_default_context(cadata=ca)
+        response = httpx.get(url, headers=headers, verify=verify, timeout=timeout)
+        response.raise_for_status()
+    except (ssl.SSLError, httpx.HTTPError) as e:
+        log.warning("Cannot read controller metrics: %s", e)
+        return None
+    return MetricsSummary.from_text(response.text)
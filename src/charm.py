@@ -3,8 +3,13 @@
 # See LICENSE file for licensing details.
 """Dispatch logic for the GCP Cloud Provider charm."""
 
+import json
 import logging
+import os
+import socket
+import time
 from pathlib import Path
+from typing import Any, List, Mapping, Optional, Tuple
 
 import ops
 from ops.interface_gcp.requires import GCPIntegrationRequires
@@ -12,8 +17,13 @@ from ops.interface_kube_control import KubeControlRequirer
 from ops.interface_tls_certificates import CertificatesRequires
 from ops.manifests import Collector, ManifestClientError
 
+from ccm_metrics import scrape, scrape_app_data, scrape_unit_data
 from config import CharmConfig
-from provider_manifests import GCPProviderManifests
+from hook_profiler import HookProfiler
+from hook_tools import HookToolCounter
+from journal import DecisionJournal
+from provider_manifests import CONTROLLER_NAME, METRICS_RELATION, GCPProviderManifests
+from rollout import RolloutTracker
 
 log = logging.getLogger(__name__)
 
@@ -22,23 +32,50 @@ class GcpCloudProviderCharm(ops.CharmBase):
     """Dispatch logic for the gcp-cloud-provider charm."""
 
     CA_CERT_PATH = Path("/srv/kubernetes/ca.crt")
+    PEER_RELATION = "cloud-provider-peers"
+    ROLLOUT_TIMEOUT = 60.0
+    UPGRADE_TIMEOUT = 300.0
+    STABLE_CHECKS = 3  # consecutive ready status checks before backing off
+    MAX_SKIPPED_CHECKS = 12  # most update-status hooks skipped between checks
+    PROFILE_PATH = Path("/var/lib/gcp-cloud-provider/profiles")
+    JOURNAL_PATH = Path("/var/lib/gcp-cloud-provider/journal.jsonl")
 
     stored = ops.StoredState()
 
     def __init__(self, *args):
         super().__init__(*args)
 
+        self.profiler = HookProfiler(self.PROFILE_PATH)
+        hook = Path(os.environ.get("JUJU_DISPATCH_PATH", "")).name
+        self.hook_tools: Optional[HookToolCounter] = None
+        if HookProfiler.enabled(hook, self.config.get("debug-profile-hooks", "")):
+            self.profiler.start(hook, memory=self.config.get("debug-profile-memory", False))
+            self.framework.observe(self.framework.on.commit, self._stop_profiler)
+            # wraps the private model backend, so only while debugging a dispatch
+            self.hook_tools = HookToolCounter(self.model._backend)
+            self.framework.observe(self.framework.on.commit, self._log_hook_tools)
+        self.journal = DecisionJournal(self.JOURNAL_PATH)
+        self.journal.start(hook)
+
         # Relation Validator and datastore
         self.kube_control = KubeControlRequirer(self, schemas="0,1")
         self.certificates = CertificatesRequires(self)
         self.integrator = GCPIntegrationRequires(self, "gcp-integration")
+        self.framework.observe(self.framework.on.commit, self._commit_journal)
         # Config Validator and datastore
         self.charm_config = CharmConfig(self)
 
         self.CA_CERT_PATH.parent.mkdir(exist_ok=True)
         self.stored.set_default(
             config_hash=None,  # hashed value of the provider config once valid
+            base_hash=None,  # hashed value of the provider config, ignoring credentials
             deployed=False,  # True if the config has been applied after new hash
+            releases={},  # release of each manifest last applied
+            release_pins={},  # release of each manifest rolled back to after a failed upgrade
+            upgrades={},  # phase of each manifest upgrade awaiting its prepull or health
+            profiles={},  # performance profile of each manifest last selected by auto
+            stable_checks=0,  # consecutive status checks finding the deployment ready
+            skip_checks=0,  # update-status hooks to skip before the next status check
         )
         self.collector = Collector(
             GCPProviderManifests(
@@ -48,6 +85,8 @@ class GcpCloudProviderCharm(ops.CharmBase):
                 self.kube_control,
             ),
         )
+        self._pin_releases()
+        self._restore_profiles()
 
         self.framework.observe(self.on.kube_control_relation_created, self._kube_control)
         self.framework.observe(self.on.kube_control_relation_joined, self._kube_control)
@@ -65,14 +104,24 @@ class GcpCloudProviderCharm(ops.CharmBase):
         self.framework.observe(self.on.gcp_integration_relation_changed, self._merge_config)
         self.framework.observe(self.on.gcp_integration_relation_broken, self._merge_config)
 
+        self.framework.observe(self.on.metrics_endpoint_relation_joined, self._metrics_endpoint)
+        self.framework.observe(self.on.metrics_endpoint_relation_broken, self._merge_config)
+
         self.framework.observe(self.on.list_versions_action, self._list_versions)
         self.framework.observe(self.on.list_resources_action, self._list_resources)
         self.framework.observe(self.on.scrub_resources_action, self._scrub_resources)
         self.framework.observe(self.on.sync_resources_action, self._sync_resources)
+        self.framework.observe(self.on.get_profile_action, self._get_profile)
+        self.framework.observe(self.on.show_journal_action, self._show_journal)
         self.framework.observe(self.on.update_status, self._update_status)
 
-        self.framework.observe(self.on.install, self._install_or_upgrade)
-        self.framework.observe(self.on.upgrade_charm, self._install_or_upgrade)
+        self.framework.observe(self.on.leader_elected, self._leader_elected)
+        self.framework.observe(self.on[self.PEER_RELATION].relation_joined, self._peers_changed)
+        self.framework.observe(self.on[self.PEER_RELATION].relation_changed, self._peers_changed)
+        self.framework.observe(self.on[self.PEER_RELATION].relation_departed, self._peers_changed)
+
+        self.framework.observe(self.on.install, self._on_install_or_upgrade)
+        self.framework.observe(self.on.upgrade_charm, self._on_install_or_upgrade)
         self.framework.observe(self.on.config_changed, self._merge_config)
         self.framework.observe(self.on.stop, self._cleanup)
 
@@ -100,23 +149,267 @@ class GcpCloudProviderCharm(ops.CharmBase):
         else:
             self.stored.deployed = True
 
+    def _get_profile(self, event):
+        reports = self.profiler.reports(event.params.get("hook", ""))
+        if not reports:
+            event.fail("No profile reports, configure debug-profile-hooks.")
+            return
+        summary = self.profiler.summary(
+            reports[0], event.params.get("limit", 20), event.params.get("sort", "cumulative")
+        )
+        event.set_results({"report": str(reports[0]), "summary": summary})
+
+    def _stop_profiler(self, _):
+        self.profiler.stop()
+
+    def _show_journal(self, event):
+        entries = self.journal.entries(event.params.get("limit", 10))
+        event.set_results({"journal": "\n".join(json.dumps(entry) for entry in entries)})
+
+    def _commit_journal(self, _):
+        self.journal.note("status", [self.unit.status.name, self.unit.status.message])
+        for controller in self.collector.manifests.values():
+            if controller.touched:
+                self.journal.touched(*controller.touched)
+        self.journal.commit()
+
+    def _log_hook_tools(self, _):
+        log.debug("Hook tools %s", self.hook_tools)
+
     def _request_gcp_features(self, event):
         self.integrator.enable_instance_inspection()
         self.integrator.enable_network_management()
         self.integrator.enable_security_management()
         self._merge_config(event=event)
 
-    def _update_status(self, _):
+    def _update_status(self, event):
+        if not self.unit.is_leader():
+            self._follow_leader(event)
+            return
+
+        if self.stored.upgrades:
+            self._reset_status_checks()
+            self._continue_upgrades(event)
+            return
+
         if not self.stored.deployed:
             return
 
+        if self.stored.skip_checks > 0:
+            if self._workloads_rolled_out():
+                self.stored.skip_checks -= 1
+                self.journal.note("status-check", "skipped")
+                return
+            self._reset_status_checks()
+
+        self.journal.note("status-check", "checked")
         unready = self.collector.unready
         if unready:
+            self._reset_status_checks()
             self.unit.status = ops.WaitingStatus(", ".join(unready))
+        elif rolled_back := self._rolled_back():
+            self._reset_status_checks()
+            self.unit.status = ops.BlockedStatus(rolled_back)
         else:
-            self.unit.status = ops.ActiveStatus("Ready")
+            self._stable_status_check()
+            active = self._active_instance()
+            summary = self._metrics_summary(active)
+            self.unit.status = ops.ActiveStatus(f"Ready ({summary})" if summary else "Ready")
             self.unit.set_workload_version(self.collector.short_version)
-            self.app.status = ops.ActiveStatus(self.collector.long_version)
+            controllers = ",".join(
+                name
+                for controller in self.collector.manifests.values()
+                for name in controller.active_controllers
+            )
+            # only the replica holding the leader lease runs the controllers
+            where = f" active on {active}" if active else ""
+            self.app.status = ops.ActiveStatus(
+                f"{self.collector.long_version}; controllers: {controllers}{where}"
+            )
+        self._publish(status=[self.unit.status.name, self.unit.status.message])
+
+    def _stable_status_check(self):
+        """Back off status checks while the deployment stays ready.
+
+        After STABLE_CHECKS ready checks in a row, each further ready check doubles
+        the number of update-status hooks skipped before the next one.
+        """
+        self.stored.stable_checks += 1
+        backoff = self.stored.stable_checks - self.STABLE_CHECKS
+        if backoff >= 0:
+            self.stored.skip_checks = min(2**backoff, self.MAX_SKIPPED_CHECKS)
+
+    def _workloads_rolled_out(self) -> bool:
+        """Read each controller workload once, in place of a skipped status check."""
+        for controller in self.collector.manifests.values():
+            rsc = controller.controller_workload
+            if not rsc:
+                continue
+            try:
+                if not RolloutTracker(controller).check(rsc).complete:
+                    return False
+            except ManifestClientError as e:
+                log.warning("Cannot read the rollout of %s: %s", rsc, e)
+                return False
+        return True
+
+    def _reset_status_checks(self):
+        """Check the status on every update-status until the deployment is stable again."""
+        self.stored.stable_checks = 0
+        self.stored.skip_checks = 0
+
+    def _metrics_endpoint(self, event):
+        """Offer the controller metrics on the host of this unit for scraping."""
+        event.relation.data[self.unit].update(scrape_unit_data(self, event.relation))
+        self._merge_config(event)
+
+    def _request_serving_cert(self):
+        """Request a certificate for the controllers to serve their metrics with.
+
+        The certificate is signed by the CA of the certificates relation, and names
+        the address of every unit, so the controller on any host can be verified.
+        """
+        if not self.model.relations.get(METRICS_RELATION):
+            return
+        if not self.model.get_relation("certificates"):
+            log.info("Controller metrics need a serving certificate from certificates")
+            return
+        self.certificates.request_server_cert(CONTROLLER_NAME, self._unit_addresses())
+        cert = self.certificates.server_certs_map.get(CONTROLLER_NAME)
+        for controller in self.collector.manifests.values():
+            controller.serving_cert = (cert.cert, cert.key) if cert else None
+
+    def _unit_addresses(self) -> List[str]:
+        addresses = {"127.0.0.1"}
+        binding = self.model.get_binding(METRICS_RELATION)
+        if binding and binding.network.ingress_address:
+            addresses.add(str(binding.network.ingress_address))
+        peers = self.model.get_relation(self.PEER_RELATION)
+        if peers:
+            addresses |= {peers.data[unit].get("ingress-address", "") for unit in peers.units}
+        return sorted(addresses - {""})
+
+    def _metrics_credentials(self) -> Optional[Tuple[str, str]]:
+        """Token of the metrics reader and the CA of the controller serving certificate."""
+        if not self.model.get_relation("certificates"):
+            return None
+        ca = self.certificates.ca
+        for controller in self.collector.manifests.values():
+            if not controller.serving_cert:
+                return None
+            try:
+                token = controller.metrics_token()
+            except ManifestClientError as e:
+                log.warning("Cannot read the metrics reader token: %s", e)
+                return None
+            if ca and token:
+                return token, ca
+        return None
+
+    def _offer_scrape_jobs(self):
+        """Offer the controller metrics to prometheus, once they can be read securely."""
+        relations = self.model.relations.get(METRICS_RELATION)
+        if not relations or not self.unit.is_leader():
+            return
+        credentials = self._metrics_credentials()
+        if not credentials:
+            log.info("Scrape job waits for the serving certificate and reader token")
+            return
+        app = scrape_app_data(self, *credentials)
+        for relation in relations:
+            relation.data[self.app].update(app)
+
+    def _active_instance(self) -> Optional[str]:
+        """Host of the controller holding the leader lease."""
+        for controller in self.collector.manifests.values():
+            try:
+                return controller.active_instance()
+            except ManifestClientError as e:
+                log.warning("Cannot find the active controller: %s", e)
+        return None
+
+    def _metrics_summary(self, active: Optional[str]) -> str:
+        if not self.model.relations.get(METRICS_RELATION):
+            return ""
+        if active != socket.gethostname():
+            # the controller on this host is standing by, its metrics show no work
+            return ""
+        credentials = self._metrics_credentials()
+        summary = scrape(*credentials) if credentials else None
+        return str(summary) if summary else ""
+
+    def _pin_releases(self):
+        for controller in self.collector.manifests.values():
+            controller.release_pin = dict(self.stored.release_pins.get(controller.name, {}))
+
+    def _clear_stale_pins(self):
+        """Drop the pins of rolled back releases once provider-release is reconfigured."""
+        configured = self.config.get("provider-release")
+        for name, pin in list(self.stored.release_pins.items()):
+            if pin.get("config") != configured:
+                log.info("Retrying %s after provider-release changed", pin["failed"])
+                del self.stored.release_pins[name]
+        self._pin_releases()
+
+    def _restore_profiles(self):
+        for controller in self.collector.manifests.values():
+            controller.sized_profile = self.stored.profiles.get(controller.name)
+
+    def _rolled_back(self) -> str:
+        for controller in self.collector.manifests.values():
+            if failed := controller.config.get("rolled-back-from"):
+                return f"{failed} unhealthy, rolled back to {controller.current_release}"
+        return ""
+
+    @property
+    def _published(self) -> Mapping[str, Any]:
+        """Deployment results published by the leader to its peers."""
+        relation = self.model.get_relation(self.PEER_RELATION)
+        if not relation:
+            return {}
+        return {key: json.loads(value) for key, value in relation.data[self.app].items()}
+
+    def _publish(self, **results):
+        """Publish deployment results from the leader to its peers."""
+        relation = self.model.get_relation(self.PEER_RELATION)
+        if relation and self.unit.is_leader():
+            relation.data[self.app].update({k: json.dumps(v) for k, v in results.items()})
+
+    def _follow_leader(self, _):
+        """Report the status of the deployment managed by the leader."""
+        if self.unit.is_leader():
+            return
+        published = self._published
+        if status := published.get("status"):
+            self.unit.status = ops.StatusBase.from_name(*status)
+            self.unit.set_workload_version(published.get("version", ""))
+        else:
+            self.unit.status = ops.WaitingStatus("Waiting for leader to deploy")
+
+    def _peers_changed(self, event):
+        """Name the addresses of the current peers in the serving certificate."""
+        if not self.unit.is_leader():
+            return self._follow_leader(event)
+        self._request_serving_cert()
+
+    def _leader_elected(self, event):
+        """Adopt the deployment state of the previous leader before reconciling.
+
+        A new leader shouldn't reapply manifests the previous leader already applied,
+        but must finish any deployment the previous leader left incomplete.
+        """
+        published = self._published
+        if "config-hash" in published:
+            self.stored.config_hash = published["config-hash"]
+            self.stored.base_hash = published.get("base-hash")
+            self.stored.deployed = published.get("deployed", False)
+            self.stored.releases = published.get("releases", {})
+            self.stored.release_pins = published.get("release-pins", {})
+            self.stored.upgrades = published.get("upgrades", {})
+            self.stored.profiles = published.get("profiles", {})
+            self._pin_releases()
+            self._restore_profiles()
+        self._merge_config(event)
 
     def _kube_control(self, event):
         self.kube_control.set_auth_request(self.unit.name, "system:masters")
@@ -167,51 +460,330 @@ class GcpCloudProviderCharm(ops.CharmBase):
         return True
 
     def _merge_config(self, event):
+        # every change of the relations or config reaches here
+        self._reset_status_checks()
         if not self._check_certificates(event):
+            self.journal.note("stopped", "certificates")
             return
 
         if not self._check_kube_control(event):
+            self.journal.note("stopped", "kube-control")
             return
 
         if not self._check_config():
+            self.journal.note("stopped", "config")
+            return
+
+        if not self.unit.is_leader():
+            self.journal.note("stopped", "follower")
+            self._follow_leader(event)
             return
 
         self.unit.status = ops.MaintenanceStatus("Evaluating Manifests")
-        new_hash = 0
+        self._clear_stale_pins()
+        self._request_serving_cert()
         for controller in self.collector.manifests.values():
+            controller.resize = True
             evaluation = controller.evaluate()
             if evaluation:
+                self.journal.note("stopped", "manifests")
                 self.unit.status = ops.BlockedStatus(evaluation)
                 return
-            new_hash += controller.hash()
-
+            if controller.sized_profile:
+                self.stored.profiles[controller.name] = controller.sized_profile
+        new_hash, base_hash = self._hashes()
+
+        creds_only = (
+            self.stored.deployed
+            and self.stored.config_hash != new_hash
+            and self.stored.base_hash == base_hash
+        )
         self.stored.deployed = False
-        if self._install_or_upgrade(event, config_hash=new_hash):
+        if creds_only:
+            installed = self._rotate_credentials(event)
+        else:
+            installed = self._install_or_upgrade(event, config_hash=new_hash)
+        if installed:
             self.stored.config_hash = new_hash
+            self.stored.base_hash = base_hash
             self.stored.deployed = True
+            if not self.stored.upgrades:
+                with self.journal.stage("rollout"):
+                    self._track_rollouts()
+        self._publish_deployment(version=self.collector.short_version if installed else "")
+        if installed:
+            self._offer_scrape_jobs()
+
+    def _hashes(self) -> Tuple[int, int]:
+        """Hash the config of every manifest, with and without its credentials."""
+        new_hash, base_hash = 0, 0
+        for controller in self.collector.manifests.values():
+            new_hash += controller.hash()
+            base_hash += controller.base_hash()
+        return new_hash, base_hash
+
+    def _publish_deployment(self, **results):
+        """Publish the deployment state of the leader along with other results."""
+        self._publish(
+            **{
+                "config-hash": self.stored.config_hash,
+                "base-hash": self.stored.base_hash,
+                "deployed": self.stored.deployed,
+                "releases": dict(self.stored.releases),
+                "release-pins": {k: dict(v) for k, v in self.stored.release_pins.items()},
+                "upgrades": {k: dict(v) for k, v in self.stored.upgrades.items()},
+                "profiles": dict(self.stored.profiles),
+                "status": [self.unit.status.name, self.unit.status.message],
+            },
+            **results,
+        )
+
+    def _on_install_or_upgrade(self, event):
+        self._reset_status_checks()
+        if self.unit.is_leader():
+            self._install_or_upgrade(event)
 
     def _install_or_upgrade(self, event, config_hash=None):
         if self.stored.config_hash == config_hash:
             log.info("Skipping until the config is evaluated.")
+            self.journal.note("install", "skipped")
             return True
 
+        self.unit.status = ops.MaintenanceStatus("Validating GCP Cloud Provider")
+        rejections = []
+        for controller in self.collector.manifests.values():
+            try:
+                with self.journal.stage("preflight"):
+                    rejections += controller.preflight()
+            except ManifestClientError as e:
+                self.unit.status = ops.WaitingStatus("Waiting for kube-apiserver")
+                log.warning("Encountered retryable preflight error: %s", e)
+                self.journal.note("install", "deferred")
+                event.defer()
+                return False
+        if rejections:
+            self.journal.note("install", "rejected")
+            more = f" (+{len(rejections) - 1} more)" if len(rejections) > 1 else ""
+            self.unit.status = ops.BlockedStatus(f"Preflight rejected {rejections[0]}{more}")
+            return False
+
         self.unit.status = ops.MaintenanceStatus("Deploying GCP Cloud Provider")
         self.unit.set_workload_version("")
         for controller in self.collector.manifests.values():
+            previous = self.stored.releases.get(controller.name)
+            upgrade = bool(previous) and previous != controller.current_release
             try:
-                controller.apply_manifests()
+                if upgrade:
+                    with self.journal.stage("prepull"):
+                        prepulled = self._prepull(controller)
+                    if not prepulled:
+                        # update-status retries the install once the image is cached
+                        self.journal.note("install", "prepulling")
+                        return False
+                with self.journal.stage("apply"):
+                    controller.apply_manifests()
+                    controller.remove_prepull()
+                if upgrade:
+                    self._start_health_check(controller)
+                    with self.journal.stage("health"):
+                        healthy = self._healthy(controller)
+                    if healthy is None:
+                        # update-status checks the health until the upgrade completes
+                        self.journal.note("install", "upgrading")
+                        continue
+                    if not healthy:
+                        self.journal.note("install", "rolled-back")
+                        self._rollback(controller, previous)
+                        return False
+                self._remove_previous_release(controller)
             except ManifestClientError as e:
                 self.unit.status = ops.WaitingStatus("Waiting for kube-apiserver")
                 log.warning("Encountered retryable installation error: %s", e)
+                self.journal.note("install", "deferred")
+                event.defer()
+                return False
+            if controller.pending_rollouts:
+                rollouts = ", ".join(str(_) for _ in controller.pending_rollouts)
+                log.info("Rollout expected for %s", rollouts)
+            else:
+                log.info("No rollout required for %s", controller.name)
+        if not self.stored.upgrades:
+            self.journal.note("install", "applied")
+        return True
+
+    def _continue_upgrades(self, event):
+        """Check again on the upgrades left waiting by an earlier hook."""
+        for controller in self.collector.manifests.values():
+            upgrade = self.stored.upgrades.get(controller.name)
+            if not upgrade:
+                continue
+            if upgrade["phase"] == "prepull":
+                # the install stopped before applying the new release, so retry it
+                self._merge_config(event)
+                return
+            try:
+                with self.journal.stage("health"):
+                    healthy = self._healthy(controller)
+                if healthy:
+                    self._remove_previous_release(controller)
+                    self.unit.status = ops.ActiveStatus("Ready")
+                    self.unit.set_workload_version(self.collector.short_version)
+                elif healthy is not None:
+                    self.journal.note("install", "rolled-back")
+                    self._rollback(controller, self.stored.releases[controller.name])
+            except ManifestClientError as e:
+                self.unit.status = ops.WaitingStatus("Waiting for kube-apiserver")
+                log.warning("Encountered retryable upgrade error: %s", e)
+                return
+        self._publish_deployment(version=self.collector.short_version)
+
+    def _prepull(self, controller) -> bool:
+        """Cache the image of the new release on every node before switching to it.
+
+        The pre-pull is checked once per hook rather than waited on, update-status
+        retries the install until the image is cached.
+        """
+        release = controller.current_release
+        self.unit.status = ops.MaintenanceStatus(f"Pre-pulling {release} image")
+        rsc = controller.prepull()
+        if not rsc:
+            return True
+        progress = RolloutTracker(controller).check(rsc)
+        if progress.complete:
+            return True
+        self.stored.upgrades[controller.name] = {"release": release, "phase": "prepull"}
+        if progress.unscheduled:
+            # the new release wouldn't be scheduled either, so don't switch to it
+            self.unit.status = ops.WaitingStatus(f"Pre-pulling {release} image: no nodes")
+        else:
+            self.unit.status = ops.WaitingStatus(f"Pre-pulling {release} image: {progress}")
+        return False
+
+    def _start_health_check(self, controller):
+        """Give the pods of the newly applied release UPGRADE_TIMEOUT to become healthy."""
+        release = controller.current_release
+        upgrade = self.stored.upgrades.get(controller.name, {})
+        if upgrade.get("phase") != "health" or upgrade.get("release") != release:
+            self.stored.upgrades[controller.name] = {
+                "release": release,
+                "phase": "health",
+                "deadline": time.time() + self.UPGRADE_TIMEOUT,
+            }
+
+    def _healthy(self, controller) -> Optional[bool]:
+        """Check once whether every controller pod of the new release reports healthy.
+
+        None while the pods are still rolling out within the deadline of the upgrade,
+        including while they wait to be scheduled.
+        """
+        rsc = controller.controller_workload
+        if not rsc:
+            return True
+        release = controller.current_release
+        progress = RolloutTracker(controller).check(rsc)
+        if progress.complete:
+            return True
+        if time.time() < self.stored.upgrades[controller.name]["deadline"]:
+            self.unit.status = ops.WaitingStatus(f"Upgrading {rsc.name} to {release}: {progress}")
+            return None
+        log.error("Upgrade of %s to %s unhealthy after %.0fs", rsc, release, self.UPGRADE_TIMEOUT)
+        return False
+
+    def _rollback(self, controller, previous):
+        """Pin the release which last deployed successfully and reapply it.
+
+        The pin holds until provider-release is reconfigured, which retries the upgrade.
+        It is only stored once the pinned release is applied, until then the upgrade
+        stays pending and update-status retries the rollback.
+        """
+        failed = controller.current_release
+        log.warning("Rolling back %s from %s to %s", controller.name, failed, previous)
+        pin = {
+            "failed": failed,
+            "rollback": previous,
+            "config": self.config.get("provider-release"),
+        }
+        controller.release_pin = pin
+        try:
+            controller.apply_manifests()
+        except ManifestClientError:
+            self._pin_releases()
+            raise
+        self.stored.release_pins[controller.name] = pin
+        self.stored.upgrades.pop(controller.name, None)
+        self.stored.config_hash, self.stored.base_hash = self._hashes()
+        self.stored.deployed = True
+        self.unit.status = ops.BlockedStatus(f"{failed} unhealthy, rolled back to {previous}")
+
+    def _remove_previous_release(self, controller):
+        """Delete resources of the previously applied release absent from the current one."""
+        previous = self.stored.releases.get(controller.name)
+        current = controller.current_release
+        if previous and previous != current:
+            stale = controller.stale_resources(previous)
+            log.info("Removing %d resources left from %s", len(stale), previous)
+            controller.delete_resources(*stale, ignore_not_found=True)
+        self.stored.releases[controller.name] = current
+        self.stored.upgrades.pop(controller.name, None)
+
+    def _rotate_credentials(self, event):
+        self.unit.status = ops.MaintenanceStatus("Rotating GCP credentials")
+        for controller in self.collector.manifests.values():
+            try:
+                with self.journal.stage("rotate"):
+                    controller.rotate_credentials()
+            except ManifestClientError as e:
+                self.unit.status = ops.WaitingStatus("Waiting for kube-apiserver")
+                log.warning("Encountered retryable credential rotation error: %s", e)
+                self.journal.note("rotate", "deferred")
                 event.defer()
                 return False
+        self.journal.note("rotate", "applied")
         return True
 
+    def _track_rollouts(self):
+        """Follow the rollouts started by the last apply, reporting progress in status."""
+        elapsed = []
+        for controller in self.collector.manifests.values():
+            tracker = RolloutTracker(controller, self.ROLLOUT_TIMEOUT)
+            for rsc in controller.pending_rollouts:
+                self.unit.status = ops.MaintenanceStatus(f"Rolling out {rsc.name}")
+                try:
+                    progress = tracker.track(rsc)
+                except ManifestClientError as e:
+                    log.warning("Cannot follow rollout of %s: %s", rsc, e)
+                    self.unit.status = ops.WaitingStatus(f"Rolling out {rsc.name}")
+                    return
+                if not progress.seen:
+                    # the watch reported nothing, leave the readiness to update-status
+                    log.warning("No rollout progress reported for %s", rsc)
+                    self.unit.status = ops.WaitingStatus(f"Rolling out {rsc.name}")
+                    return
+                if progress.unscheduled:
+                    msg = f"{rsc.name} scheduled on no nodes, check control-node-selector"
+                    self.unit.status = ops.BlockedStatus(msg)
+                    return
+                if progress.short_of_nodes:
+                    msg = (
+                        f"{rsc.name} {progress.available}/{progress.desired} available, "
+                        "more controller-replicas than matching nodes"
+                    )
+                    self.unit.status = ops.BlockedStatus(msg)
+                    return
+                if not progress.complete:
+                    self.unit.status = ops.WaitingStatus(f"Rolling out {rsc.name}: {progress}")
+                    return
+                log.info("Rollout of %s ready in %.1fs", rsc, progress.elapsed)
+                elapsed.append(progress.elapsed)
+        if elapsed:
+            self.unit.status = ops.ActiveStatus(f"Ready (rolled out in {max(elapsed):.0f}s)")
+
     def _cleanup(self, event):
-        if self.stored.config_hash:
+        if self.stored.config_hash and self.unit.is_leader():
             self.unit.status = ops.MaintenanceStatus("Cleaning up GCP Cloud Provider")
             for controller in self.collector.manifests.values():
                 try:
+                    controller.remove_prepull()
                     controller.delete_manifests(ignore_unauthorized=True)
                 except ManifestClientError:
                     self.unit.status = ops.WaitingStatus("Waiting for kube-apiserver")
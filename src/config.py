@@ -3,9 +3,11 @@
 """Config Management for the gcp-cloud-provider charm."""
 
 import logging
-from typing import Mapping, Optional
+from typing import List, Mapping, Optional
 
 log = logging.getLogger(__name__)
+PERFORMANCE_PROFILES = ("auto", "small", "large", "custom")
+DEPLOY_MODES = ("daemonset", "deployment")
 
 
 class CharmConfig:
@@ -40,6 +42,11 @@ class CharmConfig:
                 args[element] = "true"
         return args
 
+    @property
+    def controllers(self) -> List[str]:
+        """Parse charm config for the space separated list of controllers."""
+        return self.charm.config.get("controllers", "").split()
+
     @property
     def safe_control_node_selector(self) -> Optional[Mapping[str, str]]:
         """Parse charm config for node selector into a dict, return None on failure."""
@@ -54,6 +61,12 @@ class CharmConfig:
             self.control_node_selector
         except ValueError:
             return "Config control-node-selector is invalid."
+        if self.charm.config.get("performance-profile") not in PERFORMANCE_PROFILES:
+            return f"Config performance-profile must be one of {', '.join(PERFORMANCE_PROFILES)}."
+        if self.charm.config.get("deploy-mode") not in DEPLOY_MODES:
+            return f"Config deploy-mode must be one of {', '.join(DEPLOY_MODES)}."
+        if self.charm.config.get("controller-replicas", 0) < 1:
+            return "Config controller-replicas must be at least 1."
         return None
 
     @property
@@ -65,6 +78,8 @@ class CharmConfig:
                 value = self.safe_control_node_selector
             if key == "controller-extra-args":
                 value = self.controller_extra_args
+            if key == "controllers":
+                value = self.controllers
             data[key] = value
 
         for key, value in dict(**data).items():
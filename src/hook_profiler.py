@@ -0,0 +1,92 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""On-demand profiling of charm hook and action dispatches."""
+
+import cProfile
+import io
+import logging
+import pstats
+import time
+import tracemalloc
+from os import getpid
+from pathlib import Path
+from typing import List, Optional
+
+log = logging.getLogger(__name__)
+
+
+class HookProfiler:
+    """Profile a dispatch, keeping a bounded ring of reports on disk.
+
+    Each report is a cProfile stats file `<timestamp>-<pid>-<hook>.prof`, along with
+    an optional `<timestamp>-<pid>-<hook>.mem` summary of the top tracemalloc allocations.
+    The timestamp has microsecond resolution, the pid separates concurrent dispatches.
+    """
+
+    def __init__(self, path: Path, keep: int = 10):
+        self.path = path
+        self.keep = keep
+        self._profile: Optional[cProfile.Profile] = None
+        self._hook = ""
+
+    @staticmethod
+    def enabled(hook: str, hooks: str) -> bool:
+        """Determine if the hook is selected by the space separated list of hooks."""
+        selected = hooks.split()
+        return bool(hook) and ("*" in selected or hook in selected)
+
+    def start(self, hook: str, memory: bool = False):
+        """Begin profiling the named hook."""
+        self._hook = hook
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def stop(self) -> Optional[Path]:
+        """Stop profiling, write the report and trim the ring of reports."""
+        if not self._profile:
+            return None
+        self._profile.disable()
+        self.path.mkdir(parents=True, exist_ok=True)
+        now = time.time()
+        stamp = f"{time.strftime('%Y%m%dT%H%M%S', time.localtime(now))}.{int(now % 1 * 1e6):06d}"
+        report = self.path / f"{stamp}-{getpid()}-{self._hook}.prof"
+        self._profile.dump_stats(report)
+        self._profile = None
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics("lineno")[:10]
+            lines = [f"current={current} peak={peak}"] + [str(stat) for stat in top]
+            report.with_suffix(".mem").write_text("\n".join(lines))
+            tracemalloc.stop()
+        for stale in self.reports()[self.keep :]:
+            stale.unlink()
+            stale.with_suffix(".mem").unlink(missing_ok=True)
+        log.info(f"Profiled {self._hook} into {report}")
+        return report
+
+    def reports(self, hook: str = "") -> List[Path]:
+        """List reports newest first, optionally filtered by hook name."""
+        if not self.path.exists():
+            return []
+        return sorted(
+            (p for p in self.path.glob("*.prof") if not hook or self.hook_of(p) == hook),
+            reverse=True,
+        )
+
+    @staticmethod
+    def hook_of(report: Path) -> str:
+        """Name of the hook profiled into a report."""
+        return report.stem.split("-", 2)[-1]
+
+    @staticmethod
+    def summary(report: Path, limit: int = 20, sort: str = "cumulative") -> str:
+        """Summarize the top functions of a report."""
+        out = io.StringIO()
+        stats = pstats.Stats(str(report), stream=out)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        memory = report.with_suffix(".mem")
+        if memory.exists():
+            out.write("\n" + memory.read_text())
+        return out.getvalue()
@@ -0,0 +1,45 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Count the hook tools executed during a dispatch."""
+
+import logging
+from collections import Counter
+from functools import wraps
+from typing import Any, Callable
+
+log = logging.getLogger(__name__)
+
+# hook tools executed by the ops model backend
+HOOK_TOOLS = (
+    "relation_ids",
+    "relation_list",
+    "relation_get",
+    "relation_set",
+    "config_get",
+    "is_leader",
+    "status_get",
+    "status_set",
+)
+
+
+class HookToolCounter:
+    """Count the hook tools executed through the ops model backend."""
+
+    def __init__(self, backend: Any):
+        self.counts: Counter = Counter()
+        for name in HOOK_TOOLS:
+            method = getattr(backend, name, None)
+            if method:
+                setattr(backend, name, self._counted(name, method))
+
+    def _counted(self, name: str, method: Callable) -> Callable:
+        @wraps(method)
+        def counted(*args, **kwargs):
+            self.counts[name.replace("_", "-")] += 1
+            return method(*args, **kwargs)
+
+        return counted
+
+    def __str__(self) -> str:
+        """Summarize the counts, example 'relation-get=3 relation-ids=1'."""
+        return " ".join(f"{name}={count}" for name, count in self.counts.most_common())
@@ -0,0 +1,72 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Bounded on-disk journal of the decisions taken by each charm dispatch."""
+
+import json
+import logging
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+log = logging.getLogger(__name__)
+
+
+class DecisionJournal:
+    """Record one JSON line per dispatch, keeping a bounded ring of entries.
+
+    Each entry holds the hook name, the decisions noted while handling it,
+    the objects touched and the duration of each timed stage in seconds.
+    """
+
+    def __init__(self, path: Path, keep: int = 200):
+        self.path = path
+        self.keep = keep
+        self.entry: Dict[str, Any] = {}
+        self._start = 0.0
+
+    def start(self, hook: str):
+        """Begin the entry of a dispatch."""
+        self._start = time.monotonic()
+        self.entry = {"hook": hook, "at": time.strftime("%Y-%m-%dT%H:%M:%S"), "stages": {}}
+
+    def note(self, decision: str, value: Any):
+        """Record a decision, the last value noted for a decision wins."""
+        self.entry[decision] = value
+
+    def touched(self, *objs: Any):
+        """Record the objects written to the cluster."""
+        self.entry.setdefault("touched", []).extend(str(obj) for obj in objs)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a stage of the dispatch."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            stages = self.entry.setdefault("stages", {})
+            stages[name] = round(stages.get(name, 0.0) + time.monotonic() - start, 3)
+
+    def commit(self):
+        """Append the entry of the dispatch and trim the ring."""
+        if not self.entry:
+            return
+        self.entry["duration"] = round(time.monotonic() - self._start, 3)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a") as journal:
+                journal.write(json.dumps(self.entry) + "\n")
+            lines = self.path.read_text().splitlines(keepends=True)
+            if len(lines) > self.keep:
+                self.path.write_text("".join(lines[-self.keep :]))
+        except OSError as e:
+            log.warning(f"Cannot write decision journal: {e}")
+        self.entry = {}
+
+    def entries(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """The most recent entries, oldest first."""
+        if not self.path.exists() or limit < 1:
+            return []
+        lines = self.path.read_text().splitlines()[-limit:]
+        return [json.loads(line) for line in lines if line]
@@ -2,22 +2,46 @@
 # See LICENSE file for licensing details.
 """Implementation of gcp specific details of the kubernetes manifests."""
 import base64
+import json
 import logging
 import pickle
-from hashlib import md5
-from typing import Dict, Optional
+from copy import deepcopy
+from functools import cached_property
+from hashlib import md5, sha256
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Tuple, Union, cast
 
+import yaml
+from httpx import HTTPError
 from lightkube.codecs import AnyResource, from_dict
+from lightkube.core.exceptions import ApiError, ConfigError
 from lightkube.models.core_v1 import (
+    Affinity,
     ConfigMapVolumeSource,
     EnvVar,
+    HTTPGetAction,
+    Probe,
     SecretVolumeSource,
     Toleration,
     Volume,
     VolumeMount,
 )
+from lightkube.models.meta_v1 import ObjectMeta
 from lightkube.models.rbac_v1 import PolicyRule
-from ops.manifests import Addition, ManifestLabel, Manifests, Patch
+from lightkube.resources.apps_v1 import DaemonSet, Deployment
+from lightkube.resources.coordination_v1 import Lease
+from lightkube.resources.core_v1 import Node, Secret
+from lightkube.types import PatchType
+from ops.manifests import (
+    Addition,
+    ConfigRegistry,
+    HashableResource,
+    ManifestClientError,
+    ManifestLabel,
+    Manifests,
+    Patch,
+)
+from ops.manifests.manifest import FILE_TYPES
+from ops.manifests.manipulations import Subtraction
 
 log = logging.getLogger(__file__)
 NAMESPACE = "kube-system"
@@ -25,6 +49,88 @@ SECRET_NAME = "gcp-cloud-secret"
 SECRET_DATA = "gcp-creds"
 GCP_CONFIG_NAME = "cloudconfig"
 GCP_CONFIG_DATA = "cloud.config"
+CONTROLLER_NAME = "cloud-controller-manager"
+# api responses to a dry-run which can't succeed by retrying the same manifests
+REJECTED_CODES = (400, 403, 422)
+CREDS_CHECKSUM_ANNOTATION = "juju.io/credentials-checksum"
+CLOUD_CONFIG_CHECKSUM_ANNOTATION = "juju.io/cloud-config-checksum"
+# charm config rendered into the [Global] section of cloud.config
+CLOUD_CONFIG_OPTIONS = ("network-name", "subnetwork-name", "node-instance-prefix")
+WORKLOAD_KINDS = ("DaemonSet", "Deployment")
+Workload = Union[DaemonSet, Deployment]
+PREPULL_NAME = f"{CONTROLLER_NAME}-prepull"
+PAUSE_IMAGE = "pause:3.9"
+HEALTHZ_PORT = 10258
+# image digests of each release, recorded by upstream/update.py
+DIGESTS_FILE = "digests.yaml"
+METRICS_RELATION = "metrics-endpoint"
+# service account whose token prometheus and the charm read the controller metrics with
+METRICS_READER = f"{CONTROLLER_NAME}-metrics"
+# tls secret of the controller serving certificate, signed by the cluster CA
+SERVING_NAME = f"{CONTROLLER_NAME}-serving"
+# controller loops of the provider, by the names accepted by --controllers
+ALL_CONTROLLERS = ("cloud-node", "cloud-node-lifecycle", "nodeipam", "route", "service")
+DEFAULT_CONTROLLERS = ["cloud-node", "cloud-node-lifecycle", "service"]
+LARGE_CLUSTER_NODES = 100
+PERFORMANCE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "small": {
+        "kube-api-qps": 20,
+        "kube-api-burst": 30,
+        "concurrent-service-syncs": 1,
+        "node-monitor-period": "5s",
+        "route-reconciliation-period": "10s",
+        "v": 2,
+    },
+    "large": {
+        "kube-api-qps": 100,
+        "kube-api-burst": 200,
+        "concurrent-service-syncs": 10,
+        "node-monitor-period": "30s",
+        "route-reconciliation-period": "60s",
+        "v": 1,
+    },
+    "custom": {"v": 4},
+}
+# maps entirely owned by the charm, keys missing from the desired state are removed
+OWNED_MAPS = ("nodeSelector",)
+
+
+def _contained(desired: Any, live: Any) -> bool:
+    """Determine if the desired value is already represented by the live value.
+
+    The live object carries defaults and status filled in by the API server,
+    so only the fields the charm specifies are compared.
+    """
+    if isinstance(desired, Mapping):
+        return isinstance(live, Mapping) and all(
+            _contained(value, live.get(key)) for key, value in desired.items()
+        )
+    if isinstance(desired, list):
+        return (
+            isinstance(live, list)
+            and len(desired) == len(live)
+            and all(_contained(want, have) for want, have in zip(desired, live))
+        )
+    return desired == live
+
+
+def minimal_patch(desired: Mapping, live: Mapping) -> Dict:
+    """Compute a json merge patch holding only the fields of desired which differ from live.
+
+    Lists are replaced as a whole when any of their items differ.
+    """
+    patch: Dict[str, Any] = {}
+    for key, value in desired.items():
+        current = live.get(key)
+        if isinstance(value, Mapping) and isinstance(current, Mapping):
+            changes = minimal_patch(value, current)
+            if key in OWNED_MAPS:
+                changes.update({stale: None for stale in current if stale not in value})
+            if changes:
+                patch[key] = changes
+        elif not _contained(value, current):
+            patch[key] = value
+    return patch
 
 
 class CreateSecret(Addition):
@@ -55,6 +161,8 @@ class CreateSecret(Addition):
 class CreateCloudConfig(Addition):
     """Create cloud-config for the deployment."""
 
+    manifests: "GCPProviderManifests"
+
     def __call__(self) -> Optional[AnyResource]:
         """Craft the ConfigMap object for the deployment."""
         log.info("Encode cloud-config for cloud-controller.")
@@ -63,17 +171,171 @@ class CreateCloudConfig(Addition):
                 apiVersion="v1",
                 kind="ConfigMap",
                 metadata=dict(name=GCP_CONFIG_NAME, namespace=NAMESPACE),
-                data={GCP_CONFIG_DATA: "[Global]\ntoken-url = nil\nmultizone = true"},
+                data={GCP_CONFIG_DATA: self.manifests.cloud_config},
             )
         )
 
 
+class CreateServingSecret(Addition):
+    """Create the tls secret of the controller serving certificate."""
+
+    manifests: "GCPProviderManifests"
+
+    def __call__(self) -> Optional[AnyResource]:
+        """Craft the tls secret once a serving certificate is available."""
+        config = self.manifests.config
+        cert, key = config.get("serving-cert"), config.get("serving-key")
+        if not (cert and key):
+            return None
+        log.info("Encoding serving certificate for cloud-controller.")
+        return from_dict(
+            dict(
+                apiVersion="v1",
+                kind="Secret",
+                type="kubernetes.io/tls",
+                metadata=dict(name=SERVING_NAME, namespace=NAMESPACE),
+                data={
+                    "tls.crt": base64.b64encode(cert.encode()).decode(),
+                    "tls.key": base64.b64encode(key.encode()).decode(),
+                },
+            )
+        )
+
+
+class CreateMetricsAccess(Addition):
+    """Create the reader of the controller metrics, once metrics are related.
+
+    The controller delegates the authorization of /metrics to the api server, for
+    which it needs the permissions of system:auth-delegator.
+    """
+
+    def __call__(self) -> Optional[List[AnyResource]]:
+        """Craft the reader account, its token and the role bindings."""
+        if not self.manifests.config.get("metrics"):
+            return None
+        reader = dict(kind="ServiceAccount", name=METRICS_READER, namespace=NAMESPACE)
+        controller = dict(kind="ServiceAccount", name=CONTROLLER_NAME, namespace=NAMESPACE)
+        rbac = "rbac.authorization.k8s.io/v1"
+        return [
+            from_dict(
+                dict(
+                    apiVersion="v1",
+                    kind="ServiceAccount",
+                    metadata=dict(name=METRICS_READER, namespace=NAMESPACE),
+                )
+            ),
+            from_dict(
+                dict(
+                    apiVersion="v1",
+                    kind="Secret",
+                    type="kubernetes.io/service-account-token",
+                    metadata=dict(
+                        name=METRICS_READER,
+                        namespace=NAMESPACE,
+                        annotations={"kubernetes.io/service-account.name": METRICS_READER},
+                    ),
+                )
+            ),
+            from_dict(
+                dict(
+                    apiVersion=rbac,
+                    kind="ClusterRole",
+                    metadata=dict(name=f"system:{METRICS_READER}"),
+                    rules=[dict(nonResourceURLs=["/metrics"], verbs=["get"])],
+                )
+            ),
+            from_dict(
+                dict(
+                    apiVersion=rbac,
+                    kind="ClusterRoleBinding",
+                    metadata=dict(name=f"system:{METRICS_READER}"),
+                    roleRef=dict(
+                        apiGroup="rbac.authorization.k8s.io",
+                        kind="ClusterRole",
+                        name=f"system:{METRICS_READER}",
+                    ),
+                    subjects=[reader],
+                )
+            ),
+            from_dict(
+                dict(
+                    apiVersion=rbac,
+                    kind="ClusterRoleBinding",
+                    metadata=dict(name=f"{CONTROLLER_NAME}:auth-delegator"),
+                    roleRef=dict(
+                        apiGroup="rbac.authorization.k8s.io",
+                        kind="ClusterRole",
+                        name="system:auth-delegator",
+                    ),
+                    subjects=[controller],
+                )
+            ),
+        ]
+
+
+class CreateControllerDeployment(Addition):
+    """Create a Deployment for the controller when not running as a DaemonSet."""
+
+    manifests: "GCPProviderManifests"
+
+    def __call__(self) -> Optional[AnyResource]:
+        """Craft the Deployment object from the upstream DaemonSet."""
+        if self.manifests.config.get("deploy-mode") != "deployment":
+            return None
+        daemonset = self.manifests.controller_daemonset
+        if not daemonset:
+            log.error("provider release is missing the controller DaemonSet")
+            return None
+
+        template = deepcopy(daemonset["spec"]["template"])
+        affinity = template["spec"].setdefault("affinity", {})
+        affinity["podAntiAffinity"] = {
+            "requiredDuringSchedulingIgnoredDuringExecution": [
+                {
+                    "labelSelector": deepcopy(daemonset["spec"]["selector"]),
+                    "topologyKey": "kubernetes.io/hostname",
+                }
+            ]
+        }
+        replicas = self.manifests.config.get("controller-replicas")
+        log.info(f"Running provider controller as a Deployment with {replicas} replicas")
+        return from_dict(
+            dict(
+                apiVersion="apps/v1",
+                kind="Deployment",
+                metadata=deepcopy(daemonset["metadata"]),
+                spec=dict(
+                    replicas=replicas,
+                    selector=deepcopy(daemonset["spec"]["selector"]),
+                    # replicas use the host network, so only replace one at a time
+                    strategy=dict(
+                        type="RollingUpdate",
+                        rollingUpdate=dict(maxSurge=0, maxUnavailable=1),
+                    ),
+                    template=template,
+                ),
+            )
+        )
+
+
+class RemoveControllerDaemonSet(Subtraction):
+    """Remove the controller DaemonSet when running as a Deployment."""
+
+    def __call__(self, obj) -> bool:
+        """Subtract the controller DaemonSet in deployment mode."""
+        return (
+            self.manifests.config.get("deploy-mode") == "deployment"
+            and obj.kind == "DaemonSet"
+            and obj.metadata.name == CONTROLLER_NAME
+        )
+
+
 class UpdateControllerDaemonSet(Patch):
-    """Update the Controller DaemonSet object to target juju control plane."""
+    """Update the Controller workload object to target juju control plane."""
 
     def __call__(self, obj):
-        """Update the DaemonSet object in the deployment."""
-        if not (obj.kind == "DaemonSet" and obj.metadata.name == "cloud-controller-manager"):
+        """Update the DaemonSet or Deployment object in the deployment."""
+        if not (obj.kind in WORKLOAD_KINDS and obj.metadata.name == CONTROLLER_NAME):
             return
         node_selector = self.manifests.config.get("control-node-selector")
         if not isinstance(node_selector, dict):
@@ -101,14 +363,22 @@ class UpdateControllerDaemonSet(Patch):
         args = [
             ("cloud-provider", "gce"),
             ("cloud-config", f"/etc/kubernetes/config/{GCP_CONFIG_DATA}"),
-            ("controllers", "*"),
-            ("controllers", "-nodeipam"),
-            ("v", 4),
+            ("controllers", ",".join(self.manifests.active_controllers)),
             ("configure-cloud-routes", "false"),
             ("allocate-node-cidrs", "false"),
             ("cluster-name", self.manifests.config.get("cluster-name")),
         ]
-        args += list(self.manifests.config.get("controller-extra-args").items())
+        profile = self.manifests.config.get("performance-profile", "custom")
+        tuning = dict(PERFORMANCE_PROFILES[profile])
+        tuning.update(self.manifests.config.get("controller-extra-args"))
+        args += list(tuning.items())
+        serving = bool(self.manifests.config.get("serving-cert"))
+        if serving:
+            args += [
+                ("tls-cert-file", "/etc/kubernetes/serving/tls.crt"),
+                ("tls-private-key-file", "/etc/kubernetes/serving/tls.key"),
+            ]
+        log.info(f"Tuning provider with {profile} performance profile")
         containers = obj.spec.template.spec.containers
         containers[0].args = [f"--{name}={value}" for name, value in args]
         containers[0].command = ["/usr/local/bin/cloud-controller-manager"]
@@ -119,14 +389,56 @@ class UpdateControllerDaemonSet(Patch):
             VolumeMount("/etc/kubernetes/config", GCP_CONFIG_NAME, readOnly=True),
             VolumeMount("/etc/kubernetes/creds", SECRET_NAME, readOnly=True),
         ]
+        if serving:
+            containers[0].volumeMounts.append(
+                VolumeMount("/etc/kubernetes/serving", SERVING_NAME, readOnly=True)
+            )
+        # pods only count as available once the controller reports healthy
+        containers[0].readinessProbe = Probe(
+            httpGet=HTTPGetAction(
+                host="127.0.0.1", path="/healthz", port=HEALTHZ_PORT, scheme="HTTPS"
+            ),
+            periodSeconds=10,
+        )
         log.info("Adjusting container arguments")
 
         obj.spec.template.spec.volumes = [
             Volume(name=GCP_CONFIG_NAME, configMap=ConfigMapVolumeSource(name=GCP_CONFIG_NAME)),
             Volume(name=SECRET_NAME, secret=SecretVolumeSource(secretName=SECRET_NAME)),
         ]
+        if serving:
+            obj.spec.template.spec.volumes.append(
+                Volume(name=SERVING_NAME, secret=SecretVolumeSource(secretName=SERVING_NAME))
+            )
         log.info("Adjusting container cloud-config secret")
 
+        # the mounted config and credentials aren't reloaded, roll the pods when they change
+        annotations = obj.spec.template.metadata.annotations or {}
+        cloud_config = self.manifests.cloud_config
+        annotations[CLOUD_CONFIG_CHECKSUM_ANNOTATION] = sha256(cloud_config.encode()).hexdigest()
+        creds = self.manifests.config.get(SECRET_DATA)
+        if creds:
+            annotations[CREDS_CHECKSUM_ANNOTATION] = sha256(creds.encode()).hexdigest()
+        obj.spec.template.metadata.annotations = annotations
+
+
+class PinImageDigests(Patch):
+    """Pin workload images to the digests recorded for the current release."""
+
+    def __call__(self, obj):
+        """Append the recorded digest to each container image, keeping the tag."""
+        if obj.kind not in WORKLOAD_KINDS:
+            return
+        digests = self.manifests.image_digests.get(self.manifests.current_release) or {}
+        pod = obj.spec.template.spec
+        for container in (pod.containers or []) + (pod.initContainers or []):
+            digest = digests.get(container.image)
+            if not digest:
+                log.debug(f"No digest recorded for {container.image}")
+                continue
+            container.image = f"{container.image}@{digest}"
+            log.info(f"Pinning provider image {container.image}")
+
 
 class LoadBalancerSupport(Patch):
     """Update cluster role bindings to support creating Public LoadBalancers."""
@@ -167,7 +479,13 @@ class GCPProviderManifests(Manifests):
         manipulations = [
             CreateCloudConfig(self),
             CreateSecret(self),
+            CreateServingSecret(self),
+            CreateMetricsAccess(self),
+            CreateControllerDeployment(self),
+            RemoveControllerDaemonSet(self),
             ManifestLabel(self),
+            PinImageDigests(self),
+            ConfigRegistry(self),
             UpdateControllerDaemonSet(self),
             LoadBalancerSupport(self),
         ]
@@ -177,6 +495,13 @@ class GCPProviderManifests(Manifests):
         self.charm_config = charm_config
         self.integrator = integrator
         self.kube_control = kube_control
+        self.pending_rollouts: List[HashableResource] = []
+        self.touched: List[HashableResource] = []
+        self.release_pin: Mapping[str, str] = {}
+        self.sized_profile: Optional[str] = None
+        # nodes are only counted when the charm merges config, not on every dispatch
+        self.resize = False
+        self.serving_cert: Optional[Tuple[str, str]] = None
 
     @property
     def config(self) -> Dict:
@@ -195,6 +520,11 @@ class GCPProviderManifests(Manifests):
             } or {"juju-application": self.kube_control.relation.app.name}
             config["cluster-name"] = self.kube_control.get_cluster_tag()
 
+        if self.model.relations.get(METRICS_RELATION):
+            config["metrics"] = True
+            if self.serving_cert:
+                config["serving-cert"], config["serving-key"] = self.serving_cert
+
         config.update(**self.charm_config.available_data)
 
         for key, value in dict(**config).items():
@@ -202,13 +532,125 @@ class GCPProviderManifests(Manifests):
                 del config[key]
 
         config["release"] = config.pop("provider-release", None)
+        requested = config["release"] or self.default_release or self.latest_release
+        if self.release_pin.get("failed") == requested:
+            config["release"] = self.release_pin["rollback"]
+            config["rolled-back-from"] = requested
+        if config.get("performance-profile") == "auto":
+            config["performance-profile"] = self._sized_profile()
 
         return config
 
+    @property
+    def cloud_config(self) -> str:
+        """Content of cloud.config, sparing the controller discovery of known settings."""
+        config = self.config
+        lines = ["[Global]", "token-url = nil", "multizone = true"]
+        try:
+            project = json.loads(config.get(SECRET_DATA, "")).get("project_id")
+        except (ValueError, AttributeError):
+            project = None
+        if project:
+            lines.append(f"project-id = {project}")
+        lines += [f"{key} = {config[key]}" for key in CLOUD_CONFIG_OPTIONS if config.get(key)]
+        lines += [f"node-tags = {tag}" for tag in config.get("node-tags", "").split()]
+        if config.get("regional"):
+            lines.append("regional = true")
+        return "\n".join(lines)
+
+    @cached_property
+    def image_digests(self) -> Mapping[str, Mapping[str, str]]:
+        """Image digests of each release, empty when none were recorded."""
+        path = self.base_path / DIGESTS_FILE
+        if not path.exists():
+            return {}
+        return yaml.safe_load(path.read_text()) or {}
+
+    @property
+    def controller_daemonset(self) -> Optional[Mapping]:
+        """The upstream controller DaemonSet of the current release."""
+        release_path = self.manifest_path / self.current_release
+        for manifest in sorted(release_path.glob("*.yaml")):
+            for rsc in self._safe_load(manifest):
+                if rsc["kind"] == "DaemonSet" and rsc["metadata"]["name"] == CONTROLLER_NAME:
+                    return rsc
+        return None
+
+    @cached_property
+    def node_count(self) -> Optional[int]:
+        """Number of nodes in the cluster, None if the cluster can't be queried."""
+        try:
+            return sum(1 for _ in self.client.list(Node, chunk_size=500))
+        except (ManifestClientError, ApiError, ConfigError, HTTPError):
+            log.warning("Cannot count cluster nodes")
+            return None
+
+    def metrics_token(self) -> Optional[str]:
+        """Token of the metrics reader, None until the api server has issued it."""
+        try:
+            secret = self.client.get(Secret, METRICS_READER, namespace=NAMESPACE)
+        except ApiError as e:
+            if e.status.code == 404:
+                return None
+            raise ManifestClientError(f"Failed reading {METRICS_READER} token", e) from e
+        except HTTPError as e:
+            raise ManifestClientError(f"Failed reading {METRICS_READER} token", e) from e
+        token = (secret.data or {}).get("token")
+        return base64.b64decode(token).decode() if token else None
+
+    def active_instance(self) -> Optional[str]:
+        """Host of the controller holding the leader lease, None if no controller holds it.
+
+        Only the holder runs the controller loops, the other replicas are standing by.
+        """
+        try:
+            lease = self.client.get(Lease, CONTROLLER_NAME, namespace=NAMESPACE)
+        except ApiError as e:
+            if e.status.code == 404:
+                return None
+            raise ManifestClientError(f"Failed reading {CONTROLLER_NAME} lease", e) from e
+        except HTTPError as e:
+            raise ManifestClientError(f"Failed reading {CONTROLLER_NAME} lease", e) from e
+        holder = lease.spec.holderIdentity if lease.spec else None
+        # the identity of a holder is "<hostname>_<uuid>"
+        return holder.rsplit("_", 1)[0] if holder else None
+
+    def _sized_profile(self) -> str:
+        """Select a performance profile from the size of the cluster.
+
+        While the nodes can't be counted, the profile last selected is kept so the
+        tuning doesn't flip with the availability of the api server. Unless `resize`
+        is set, the nodes aren't counted and the profile last selected is used.
+        """
+        if not self.resize:
+            return self.sized_profile or "custom"
+        if self.node_count is None:
+            log.warning(f"Keeping the {self.sized_profile or 'custom'} performance profile")
+            return self.sized_profile or "custom"
+        self.sized_profile = "large" if self.node_count >= LARGE_CLUSTER_NODES else "small"
+        return self.sized_profile
+
     def hash(self) -> int:
         """Calculate a hash of the current configuration."""
         return int(md5(pickle.dumps(self.config)).hexdigest(), 16)
 
+    def base_hash(self) -> int:
+        """Calculate a hash of the current configuration, excluding the credentials."""
+        config = {k: v for k, v in self.config.items() if k != SECRET_DATA}
+        return int(md5(pickle.dumps(config)).hexdigest(), 16)
+
+    @property
+    def active_controllers(self) -> List[str]:
+        """Controller loops enabled by the controllers config, in the provider's order.
+
+        As with --controllers, "*" enables every loop and "-name" disables one
+        regardless of its position in the list.
+        """
+        names = self.config.get("controllers") or DEFAULT_CONTROLLERS
+        enabled = set(ALL_CONTROLLERS) if "*" in names else set(names)
+        disabled = {name[1:] for name in names if name.startswith("-")}
+        return [name for name in ALL_CONTROLLERS if name in enabled - disabled]
+
     def evaluate(self) -> Optional[str]:
         """Determine if manifest_config can be applied to manifests."""
         props = ["control-node-selector", "cluster-name", SECRET_DATA]
@@ -216,4 +658,205 @@ class GCPProviderManifests(Manifests):
             value = self.config.get(prop)
             if not value:
                 return f"Provider manifests waiting for definition of {prop}"
+        names = self.config.get("controllers") or DEFAULT_CONTROLLERS
+        unknown = [
+            name for name in names if name != "*" and name.lstrip("-") not in ALL_CONTROLLERS
+        ]
+        if unknown:
+            return f"Config controllers unknown: {', '.join(unknown)}"
+        if not self.active_controllers:
+            return "Config controllers enables no controllers"
         return None
+
+    def stale_resources(self, release: str) -> FrozenSet[HashableResource]:
+        """Resources of another release which aren't part of the current manifests.
+
+        Only the identities from the release's manifest files are compared, so
+        no listing of the cluster is required.
+        """
+        release_path = self.manifest_path / release
+        if not release_path.is_dir():
+            log.warning(f"Release {release} is no longer available, use scrub-resources")
+            return frozenset()
+        previous = {
+            HashableResource(rsc)
+            for ext in FILE_TYPES
+            for manifest in sorted(release_path.glob(f"*.{ext}"))
+            for rsc in self._resource_from_yaml(manifest)
+        }
+        return frozenset(previous - set(self.resources))
+
+    def preflight(self) -> List[str]:
+        """Validate every resource with a server-side dry-run, collecting all rejections.
+
+        Raises ManifestClientError if the api server can't be reached, as the dry-run
+        should be retried rather than reported as invalid.
+        """
+        log.info(f"Preflight {self.name} version: {self.current_release}")
+        rejections = []
+        for rsc in self.resources:
+            msg = f"Failed Preflight {rsc}"
+            try:
+                self.client.apply(rsc.resource, force=True, dry_run=True)
+            except ApiError as ex:
+                if ex.status.code not in REJECTED_CODES:
+                    log.exception(msg)
+                    raise ManifestClientError(msg, ex) from ex
+                rejections.append(f"{rsc}: {ex.status.message}")
+            except HTTPError as ex:
+                log.exception(msg)
+                raise ManifestClientError(msg, ex) from ex
+        for rejection in rejections:
+            log.error(f"Preflight rejected {rejection}")
+        return rejections
+
+    @property
+    def controller_workload(self) -> Optional[HashableResource]:
+        """The desired controller DaemonSet or Deployment."""
+        return next(
+            (
+                rsc
+                for rsc in self.resources
+                if rsc.kind in WORKLOAD_KINDS and rsc.name == CONTROLLER_NAME
+            ),
+            None,
+        )
+
+    def prepull(self) -> Optional[HashableResource]:
+        """Apply a DaemonSet caching the controller image on the nodes which will run it.
+
+        The image is pulled by an init container, so a pod of the DaemonSet is only
+        available once its node has the image cached.
+        """
+        workload = self.controller_workload
+        if not workload:
+            return None
+        pod = workload.resource.spec.template.spec
+        container = pod.containers[0]
+        registry = self.config.get("image-registry", "registry.k8s.io")
+        labels = {"component": PREPULL_NAME}
+        obj = from_dict(
+            dict(
+                apiVersion="apps/v1",
+                kind="DaemonSet",
+                metadata=dict(name=PREPULL_NAME, namespace=NAMESPACE, labels=dict(labels)),
+                spec=dict(
+                    selector=dict(matchLabels=labels),
+                    template=dict(
+                        metadata=dict(labels=labels),
+                        spec=dict(
+                            nodeSelector=pod.nodeSelector,
+                            tolerations=[t.to_dict() for t in pod.tolerations or []],
+                            initContainers=[
+                                dict(
+                                    name="prepull",
+                                    image=container.image,
+                                    imagePullPolicy="IfNotPresent",
+                                    command=container.command,
+                                    args=["--version"],
+                                )
+                            ],
+                            containers=[dict(name="pause", image=f"{registry}/{PAUSE_IMAGE}")],
+                        ),
+                    ),
+                ),
+            )
+        )
+        if pod.affinity and pod.affinity.nodeAffinity:
+            obj.spec.template.spec.affinity = Affinity(nodeAffinity=pod.affinity.nodeAffinity)
+        for manipulate in self.manipulations:
+            if isinstance(manipulate, ManifestLabel):
+                manipulate(obj)
+        rsc = HashableResource(obj)
+        log.info(f"Pre-pulling {container.image} with {rsc}")
+        super().apply_resources(rsc)
+        self.touched.append(rsc)
+        return rsc
+
+    def remove_prepull(self):
+        """Delete the DaemonSet caching the controller image."""
+        metadata = ObjectMeta(name=PREPULL_NAME, namespace=NAMESPACE)
+        self.delete_resources(
+            HashableResource(DaemonSet(spec=None, metadata=metadata)), ignore_not_found=True
+        )
+
+    def apply_manifests(self):
+        """Apply the manifests, then remove the controller workload of the other deploy mode."""
+        super().apply_manifests()
+        desired = {rsc.kind for rsc in self.resources if rsc.name == CONTROLLER_NAME}
+        metadata = ObjectMeta(name=CONTROLLER_NAME, namespace=NAMESPACE)
+        replaced = [
+            HashableResource(kind(spec=None, metadata=metadata))
+            for kind in (DaemonSet, Deployment)
+            if kind.__name__ not in desired
+        ]
+        self.delete_resources(*replaced, ignore_not_found=True)
+
+    def rotate_credentials(self):
+        """Apply only the credentials secret, the cloud.config and the workloads which mount them.
+
+        The project of the credentials is part of cloud.config. The workloads are
+        patched with the new checksum annotations, resulting in a single rollout of
+        the cloud-controller-manager.
+        """
+        log.info(f"Rotating {self.name} credentials")
+        rotated = (("Secret", SECRET_NAME), ("ConfigMap", GCP_CONFIG_NAME))
+        self.apply_resources(
+            *(
+                rsc
+                for rsc in self.resources
+                if (rsc.kind, rsc.name) in rotated or rsc.kind in WORKLOAD_KINDS
+            )
+        )
+
+    def apply_resources(self, *resources: HashableResource):
+        """Apply resources, patching workloads with only the fields which changed.
+
+        Every change to a workload's pod template restarts the cloud-controller-manager,
+        so workloads are compared with the live object and left alone when unchanged.
+        The workloads which will roll out are recorded in `pending_rollouts`.
+        """
+        self.pending_rollouts = []
+        workloads = [rsc for rsc in resources if rsc.kind in WORKLOAD_KINDS]
+        others = [rsc for rsc in resources if rsc.kind not in WORKLOAD_KINDS]
+        if others:
+            super().apply_resources(*others)
+            self.touched += others
+        for rsc in workloads:
+            if self._patch_workload(rsc):
+                self.pending_rollouts.append(rsc)
+
+    def _patch_workload(self, rsc: HashableResource) -> bool:
+        """Patch a workload to match the desired state, return True if it will roll out."""
+        obj = cast(Workload, rsc.resource)
+        kind, name = type(obj), str(rsc.name)
+        msg = f"Failed Patching {rsc}"
+        try:
+            live = self.client.get(kind, name, namespace=rsc.namespace)
+        except ApiError as ex:
+            if ex.status.code != 404:
+                log.exception(msg)
+                raise ManifestClientError(msg, ex) from ex
+            super().apply_resources(rsc)
+            self.touched.append(rsc)
+            return True
+        except HTTPError as ex:
+            log.exception(msg)
+            raise ManifestClientError(msg, ex) from ex
+
+        patch: Dict[str, Any] = minimal_patch(obj.to_dict(), live.to_dict())
+        if not patch:
+            log.info(f"Unchanged {rsc}")
+            return False
+
+        rollout = "template" in patch.get("spec", {})
+        log.info(f"Patching {rsc} fields {sorted(patch)} (rollout={rollout})")
+        try:
+            self.client.patch(
+                kind, name, patch, namespace=rsc.namespace, patch_type=PatchType.MERGE
+            )
+        except (ApiError, HTTPError) as ex:
+            log.exception(msg)
+            raise ManifestClientError(msg, ex) from ex
+        self.touched.append(rsc)
+        return rollout
@@ -0,0 +1,182 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Track the rollout of the cloud-controller-manager after manifests are applied."""
+
+import logging
+import queue
+import threading
+from dataclasses import dataclass
+from time import monotonic
+from typing import Any, Iterator, Optional, Tuple
+
+from httpx import HTTPError
+from lightkube.core.exceptions import ApiError
+from lightkube.resources.core_v1 import Pod
+from ops.manifests import HashableResource, ManifestClientError
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class RolloutProgress:
+    """Rollout state of a DaemonSet or Deployment."""
+
+    desired: int = 0
+    updated: int = 0
+    available: int = 0
+    observed: bool = False
+    elapsed: Optional[float] = None
+    seen: bool = False  # False until the watch reports the workload
+    pods: int = 0  # pods of a Deployment, counted while its rollout is incomplete
+    unschedulable: int = 0  # of those pods, the ones which fit on no node
+
+    @classmethod
+    def from_workload(cls, obj) -> "RolloutProgress":
+        """Read the rollout state from a workload's status."""
+        status, generation = obj.status, obj.metadata.generation
+        if not status:
+            return cls(seen=True)
+        observed = (status.observedGeneration or 0) >= (generation or 0)
+        if obj.kind == "DaemonSet":
+            return cls(
+                desired=status.desiredNumberScheduled or 0,
+                updated=status.updatedNumberScheduled or 0,
+                available=status.numberAvailable or 0,
+                observed=observed,
+                seen=True,
+            )
+        return cls(
+            desired=obj.spec.replicas or 0,
+            updated=status.updatedReplicas or 0,
+            available=status.availableReplicas or 0,
+            observed=observed,
+            seen=True,
+        )
+
+    @property
+    def complete(self) -> bool:
+        """True when every desired pod is updated and available."""
+        return (
+            self.observed
+            and self.desired > 0
+            and self.updated == self.desired
+            and self.available == self.desired
+        )
+
+    @property
+    def unscheduled(self) -> bool:
+        """True when the workload matches no nodes on which to schedule pods.
+
+        A DaemonSet then desires no pods, none of a Deployment's pods could be placed.
+        """
+        if not self.observed:
+            return False
+        placed = self.available > 0 or self.unschedulable < self.pods
+        return self.desired == 0 or (self.pods > 0 and not placed)
+
+    @property
+    def short_of_nodes(self) -> bool:
+        """True when some pods of a Deployment run, but others fit on no node.
+
+        Such as when there are more replicas than nodes matching the node selector.
+        """
+        return self.observed and self.available > 0 and self.unschedulable > 0
+
+    def __str__(self) -> str:
+        """Progress summary, example '2/3 updated'."""
+        if not self.seen:
+            return "progress unknown"
+        return f"{self.updated}/{self.desired} updated"
+
+
+class RolloutTracker:
+    """Follow a workload rollout with a single api watch for a bounded time."""
+
+    def __init__(self, manifests, timeout: float = 60.0):
+        self.manifests = manifests
+        self.timeout = timeout
+
+    def _events(self, rsc: HashableResource) -> Iterator[Tuple[str, Any]]:
+        """Yield watch events until the timeout expires.
+
+        The watch runs in a daemon thread, as the api server may send no events
+        while a rollout is stalled and the watch would otherwise block.
+        """
+        events: queue.Queue = queue.Queue()
+
+        def produce():
+            try:
+                for event in self.manifests.client.watch(
+                    type(rsc.resource),
+                    namespace=rsc.namespace,
+                    fields={"metadata.name": rsc.name},
+                    server_timeout=int(self.timeout) + 1,
+                ):
+                    events.put(event)
+            except (ApiError, HTTPError, ManifestClientError) as ex:
+                events.put(ex)
+            else:
+                events.put(None)
+
+        threading.Thread(target=produce, daemon=True).start()
+        deadline = monotonic() + self.timeout
+        while (remaining := deadline - monotonic()) > 0:
+            try:
+                item = events.get(timeout=remaining)
+            except queue.Empty:
+                return
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise ManifestClientError(f"Failed watching {rsc}", item) from item
+            yield item
+
+    def track(self, rsc: HashableResource) -> RolloutProgress:
+        """Watch a workload until its rollout completes, stalls unscheduled or times out."""
+        start = monotonic()
+        progress, obj = RolloutProgress(), None
+        for _, obj in self._events(rsc):
+            progress = RolloutProgress.from_workload(obj)
+            log.info(f"Rollout of {rsc}: {progress}")
+            if progress.complete:
+                progress.elapsed = monotonic() - start
+                break
+            if progress.unscheduled:
+                break
+        if obj is not None and obj.kind == "Deployment" and not progress.complete:
+            progress.pods, progress.unschedulable = self._count_pods(obj)
+        return progress
+
+    def check(self, rsc: HashableResource) -> RolloutProgress:
+        """Read the rollout state of a workload once, without waiting on it."""
+        try:
+            obj = self.manifests.client.get(
+                type(rsc.resource), rsc.name, namespace=rsc.namespace
+            )
+        except (ApiError, HTTPError) as ex:
+            raise ManifestClientError(f"Failed reading {rsc}", ex) from ex
+        progress = RolloutProgress.from_workload(obj)
+        if rsc.kind == "Deployment" and not progress.complete:
+            progress.pods, progress.unschedulable = self._count_pods(obj)
+        return progress
+
+    def _count_pods(self, obj) -> Tuple[int, int]:
+        """Count the pods of the Deployment, and those which can't be scheduled."""
+        selector = obj.spec.selector.matchLabels if obj.spec and obj.spec.selector else None
+        if not selector:
+            return 0, 0
+        try:
+            pods = list(
+                self.manifests.client.list(Pod, namespace=obj.metadata.namespace, labels=selector)
+            )
+        except (ApiError, HTTPError, ManifestClientError) as ex:
+            log.warning(f"Cannot list pods of {obj.metadata.name}: {ex}")
+            return 0, 0
+        unschedulable = sum(
+            any(
+                cond.type == "PodScheduled" and cond.reason == "Unschedulable"
+                for cond in (pod.status and pod.status.conditions) or []
+            )
+            for pod in pods
+        )
+        return len(pods), unschedulable
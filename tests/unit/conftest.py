@@ -1,9 +1,24 @@
 # Copyright 2022 Canonical Ltd.
 # See LICENSE file for licensing details.
+import gc
+import tracemalloc
 import unittest.mock as mock
+from contextlib import contextmanager
+from functools import partial
+from ipaddress import ip_network
+from pathlib import Path
 
 import pytest
-from lightkube import ApiError
+import yaml
+from kube_fake import FakeKubeAPI
+from lightkube import ApiError, Client
+from lightkube.models.core_v1 import Toleration
+from ops.testing import Harness
+
+from charm import GcpCloudProviderCharm
+from provider_manifests import GCPProviderManifests
+
+MEMORY_BUDGETS = Path("tests/data/memory_budgets.yaml")
 
 
 @pytest.fixture()
@@ -21,3 +36,118 @@ def api_error_klass():
 def lk_client():
     with mock.patch("ops.manifests.manifest.Client", autospec=True) as mock_lightkube:
         yield mock_lightkube.return_value
+
+
+@pytest.fixture()
+def kube_api(lk_client):
+    """Serve the manifests' lightkube client from an in-process fake api server."""
+    with FakeKubeAPI() as api, mock.patch(
+        "ops.manifests.manifest.Client", side_effect=partial(Client, config=api.config)
+    ):
+        yield api
+
+
+@pytest.fixture()
+def manifests():
+    charm = mock.MagicMock()
+    charm.model.app.name = "gcp-cloud-provider"
+    charm.model.relations = {}
+    charm_config = mock.MagicMock()
+    charm_config.available_data = {"controller-extra-args": {}, "provider-release": "v0.27.1"}
+    integrator = mock.MagicMock()
+    integrator.is_ready = True
+    integrator.credentials = "abc"
+    kube_control = mock.MagicMock()
+    kube_control.is_ready = True
+    kube_control.get_registry_location.return_value = "rocks.canonical.com/cdk"
+    kube_control.get_controller_taints.return_value = [
+        Toleration("NoSchedule", "node-role.kubernetes.io/control-plane")
+    ]
+    kube_control.get_controller_labels.return_value = []
+    kube_control.get_cluster_tag.return_value = "kubernetes-abcd"
+    kube_control.relation.app.name = "kubernetes-control-plane"
+    yield GCPProviderManifests(charm, charm_config, integrator, kube_control)
+
+
+@pytest.fixture()
+def memory_budget():
+    """Trace the allocations of a block, failing when they exceed its stored budget.
+
+    Budgets are in KiB, the peak of the block and what it retained once it completed.
+    """
+    budgets = yaml.safe_load(MEMORY_BUDGETS.read_text())
+
+    @contextmanager
+    def measure(name: str):
+        budget = budgets[name]
+        gc.collect()
+        tracemalloc.start()
+        try:
+            yield
+            gc.collect()
+            retained, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert peak <= budget["peak"] * 1024, f"{name} peak {peak >> 10} KiB over budget"
+        assert (
+            retained <= budget["retained"] * 1024
+        ), f"{name} retained {retained >> 10} KiB over budget"
+
+    yield measure
+
+
+@pytest.fixture
+def harness():
+    harness = Harness(GcpCloudProviderCharm)
+    try:
+        yield harness
+    finally:
+        harness.cleanup()
+
+
+@pytest.fixture(autouse=True)
+def mock_ca_cert(tmpdir):
+    ca_cert = Path(tmpdir) / "ca.crt"
+    with mock.patch.object(GcpCloudProviderCharm, "CA_CERT_PATH", ca_cert):
+        yield ca_cert
+
+
+@pytest.fixture(autouse=True)
+def mock_journal(tmpdir):
+    journal = Path(tmpdir) / "journal.jsonl"
+    with mock.patch.object(GcpCloudProviderCharm, "JOURNAL_PATH", journal):
+        yield journal
+
+
+@pytest.fixture()
+def gcp_integration():
+    with mock.patch("charm.GCPIntegrationRequires") as mocked:
+        integration = mocked.return_value
+        integration.evaluate_relation.return_value = None
+        integration.credentials = "abc"
+        yield integration
+
+
+@pytest.fixture()
+def certificates():
+    with mock.patch("charm.CertificatesRequires") as mocked:
+        certificates = mocked.return_value
+        certificates.ca = "abcd"
+        certificates.evaluate_relation.return_value = None
+        yield certificates
+
+
+@pytest.fixture()
+def kube_control():
+    with mock.patch("charm.KubeControlRequirer") as mocked:
+        kube_control = mocked.return_value
+        kube_control.evaluate_relation.return_value = None
+        kube_control.get_registry_location.return_value = "rocks.canonical.com/cdk"
+        kube_control.get_controller_taints.return_value = []
+        kube_control.get_controller_labels.return_value = []
+        kube_control.get_ca_certificate.return_value = None
+        kube_control.get_cluster_tag.return_value = "kubernetes-4ypskxahbu3rnfgsds3pksvwe3uh0lxt"
+        kube_control.get_cluster_cidr.return_value = ip_network("192.168.0.0/16")
+        kube_control.relation.app.name = "kubernetes-control-plane"
+        kube_control.relation.units = [f"kubernetes-control-plane/{_}" for _ in range(2)]
+        yield kube_control
@@ -0,0 +1,407 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""In-process stand-in for the kube-apiserver, serving lightkube clients over HTTP.
+
+Objects of any kind are stored by api path, so every kind of the provider manifests,
+CustomResourceDefinitions and Nodes are served. Latency and error responses can be
+injected, and every request is logged for assertions.
+"""
+
+import json
+import threading
+import time
+import uuid
+from copy import deepcopy
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple, final
+from urllib.parse import parse_qsl, urlsplit
+
+from lightkube import KubeConfig
+from lightkube.codecs import from_dict
+from lightkube.config.models import Cluster, User
+from lightkube.core.resource import NamespacedResource, api_info
+
+# (api prefix, plural, namespace, name)
+Key = Tuple[str, str, Optional[str], str]
+WORKLOAD_PLURALS = ("daemonsets", "deployments")
+STATUS_REASONS = {
+    401: "Unauthorized",
+    404: "NotFound",
+    409: "AlreadyExists",
+    500: "InternalError",
+    503: "ServiceUnavailable",
+    504: "Timeout",
+}
+
+
+@dataclass
+class Fault:
+    """An error response returned in place of handling matching requests."""
+
+    code: int
+    times: int = 1
+    method: Optional[str] = None
+    path: str = ""
+
+    def matches(self, method: str, path: str) -> bool:
+        """Determine if the fault applies to a request."""
+        return self.times > 0 and self.method in (None, method) and self.path in path
+
+
+@dataclass
+class KubeRequest:
+    """A request served by the fake api server."""
+
+    method: str
+    path: str
+    query: Dict[str, str]
+    code: int = 0
+    elapsed: float = 0.0
+    content_type: str = ""
+
+
+@dataclass
+class _Route:
+    prefix: str
+    plural: str
+    namespace: Optional[str] = None
+    name: Optional[str] = None
+
+    @classmethod
+    def parse(cls, path: str) -> "_Route":
+        parts = path.strip("/").split("/")
+        split = 2 if parts[0] == "api" else 3
+        prefix, rest = "/".join(parts[:split]), parts[split:]
+        if rest[0] == "namespaces" and len(rest) >= 3:
+            return cls(prefix, rest[2], rest[1], (rest[3:] or [None])[0])
+        return cls(prefix, rest[0], None, (rest[1:] or [None])[0])
+
+    @property
+    def key(self) -> Key:
+        return self.prefix, self.plural, self.namespace, self.name or ""
+
+
+def _merge(target: Any, patch: Any) -> Any:
+    """Apply a json merge patch (RFC 7386)."""
+    if not isinstance(patch, Mapping):
+        return deepcopy(patch)
+    result = dict(target) if isinstance(target, Mapping) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = _merge(result.get(key), value)
+    return result
+
+
+def _selected(obj: Mapping, labels: str, fields: str) -> bool:
+    metadata = obj.get("metadata", {})
+    for term in filter(None, labels.split(",")):
+        key, _, value = term.partition("=")
+        if (metadata.get("labels") or {}).get(key) != value:
+            return False
+    for term in filter(None, fields.split(",")):
+        key, _, value = term.partition("=")
+        if key == "metadata.name" and metadata.get("name") != value:
+            return False
+        if key == "metadata.namespace" and metadata.get("namespace") != value:
+            return False
+    return True
+
+
+@final
+class FakeKubeAPI:
+    """A kube-apiserver stand-in serving from memory on a local port.
+
+    Workloads are reported as rolled out on every node as soon as they are written,
+    `ready_nodes` controls how many pods a DaemonSet schedules.
+    """
+
+    def __init__(self, latency: float = 0.0, ready_nodes: int = 1):
+        self.latency = latency
+        self.ready_nodes = ready_nodes
+        self.objects: Dict[Key, Dict] = {}
+        self.requests: List[KubeRequest] = []
+        self.faults: List[Fault] = []
+        self._history: List[Tuple[int, str, Key, Dict]] = []
+        self._version = 0
+        self._changed = threading.Condition()
+        self._stopped = threading.Event()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs=dict(poll_interval=0.05), daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        """Base url of the api server."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def config(self) -> KubeConfig:
+        """Client configuration addressing this api server."""
+        return KubeConfig.from_one(
+            cluster=Cluster(server=self.url), user=User(token="fake"), namespace="default"
+        )
+
+    def start(self) -> "FakeKubeAPI":
+        """Start serving requests."""
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving, releasing any open watches."""
+        self._stopped.set()
+        with self._changed:
+            self._changed.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeKubeAPI":
+        """Serve for the duration of a with block."""
+        return self.start()
+
+    def __exit__(self, *_):
+        """Stop serving at the end of a with block."""
+        self.stop()
+
+    def fail(self, code: int, times: int = 1, method: Optional[str] = None, path: str = ""):
+        """Respond to the next matching requests with an error status code."""
+        self.faults.append(Fault(code, times, method, path))
+
+    def add(self, *objs: Mapping):
+        """Store objects as if created by another client."""
+        for obj in objs:
+            kind = type(from_dict(dict(obj)))
+            info = api_info(kind)
+            group, version = info.resource.group, info.resource.version
+            prefix = f"apis/{group}/{version}" if group else f"api/{version}"
+            namespace = None
+            if issubclass(kind, NamespacedResource):
+                namespace = obj["metadata"].get("namespace", "default")
+            key = (prefix, info.plural, namespace, obj["metadata"]["name"])
+            self._store(key, deepcopy(dict(obj)), "ADDED")
+
+    def get(self, plural: str, name: str, namespace: Optional[str] = None) -> Optional[Dict]:
+        """Look up a stored object by plural resource name."""
+        return next(
+            (
+                obj
+                for (_, p, ns, n), obj in self.objects.items()
+                if (p, ns, n) == (plural, namespace, name)
+            ),
+            None,
+        )
+
+    def count(self, method: Optional[str] = None, path: str = "") -> int:
+        """Count logged requests matching a method and path fragment."""
+        return sum(1 for r in self.requests if method in (None, r.method) and path in r.path)
+
+    def _store(self, key: Key, obj: Dict, event: str):
+        with self._changed:
+            self._version += 1
+            metadata = obj.setdefault("metadata", {})
+            metadata["resourceVersion"] = str(self._version)
+            if event == "DELETED":
+                self.objects.pop(key, None)
+            else:
+                previous = self.objects.get(key)
+                metadata.setdefault("uid", str(uuid.uuid4()))
+                generation = (previous or {}).get("metadata", {}).get("generation", 0)
+                if not previous or previous.get("spec") != obj.get("spec"):
+                    generation += 1
+                metadata["generation"] = generation
+                if key[1] in WORKLOAD_PLURALS:
+                    obj["status"] = self._rolled_out(key[1], obj)
+                self.objects[key] = obj
+            self._history.append((self._version, event, key, deepcopy(obj)))
+            self._changed.notify_all()
+
+    def _rolled_out(self, plural: str, obj: Dict) -> Dict:
+        generation = obj["metadata"]["generation"]
+        if plural == "daemonsets":
+            pods = self.ready_nodes
+            return dict(
+                observedGeneration=generation,
+                currentNumberScheduled=pods,
+                desiredNumberScheduled=pods,
+                numberMisscheduled=0,
+                numberReady=pods,
+                numberAvailable=pods,
+                updatedNumberScheduled=pods,
+            )
+        pods = obj.get("spec", {}).get("replicas", 1)
+        return dict(
+            observedGeneration=generation,
+            replicas=pods,
+            readyReplicas=pods,
+            availableReplicas=pods,
+            updatedReplicas=pods,
+        )
+
+    def _matching(self, route: _Route, query: Mapping[str, str]) -> Iterator[Tuple[Key, Dict]]:
+        for key, obj in self.objects.items():
+            prefix, plural, namespace, _ = key
+            if (prefix, plural) != (route.prefix, route.plural):
+                continue
+            if route.namespace and namespace != route.namespace:
+                continue
+            if _selected(obj, query.get("labelSelector", ""), query.get("fieldSelector", "")):
+                yield key, obj
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *_):
+                pass
+
+            def _reply(self, code: int, body: Mapping):
+                data = json.dumps(body).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _status(self, code: int, message: str):
+                self._reply(
+                    code,
+                    dict(
+                        kind="Status",
+                        apiVersion="v1",
+                        metadata={},
+                        status="Failure",
+                        message=message,
+                        reason=STATUS_REASONS.get(code, "Unknown"),
+                        code=code,
+                    ),
+                )
+                return code
+
+            def _body(self) -> Dict:
+                return json.loads(self.payload or b"{}")
+
+            def _serve(self, method: str):
+                start = time.monotonic()
+                url = urlsplit(self.path)
+                query = dict(parse_qsl(url.query))
+                # consume the body even when faulting, the connection is kept alive
+                self.payload = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                record = KubeRequest(
+                    method, url.path, query, content_type=self.headers.get("Content-Type", "")
+                )
+                api.requests.append(record)
+                if api.latency:
+                    time.sleep(api.latency)
+                fault = next((f for f in api.faults if f.matches(method, url.path)), None)
+                if fault:
+                    fault.times -= 1
+                    reason = STATUS_REASONS.get(fault.code, "Unknown")
+                    record.code = self._status(fault.code, f"injected fault ({reason})")
+                else:
+                    handle = getattr(self, f"_{method.lower()}")
+                    record.code = handle(_Route.parse(url.path), query)
+                record.elapsed = time.monotonic() - start
+
+            def _not_found(self, route: _Route) -> int:
+                return self._status(404, f'{route.plural} "{route.name}" not found')
+
+            def _get(self, route: _Route, query: Dict[str, str]) -> int:
+                if query.get("watch") == "true":
+                    return self._watch(route, query)
+                if route.name:
+                    obj = api.objects.get(route.key)
+                    if obj is None:
+                        return self._not_found(route)
+                    self._reply(200, obj)
+                    return 200
+                items = [obj for _, obj in api._matching(route, query)]
+                metadata = {"resourceVersion": str(api._version)}
+                body = dict(kind="List", apiVersion="v1", metadata=metadata, items=items)
+                self._reply(200, body)
+                return 200
+
+            def _watch(self, route: _Route, query: Dict[str, str]) -> int:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                deadline = time.monotonic() + float(query.get("timeoutSeconds", 5))
+                since = int(query.get("resourceVersion") or 0)
+                if not since:
+                    for _, obj in list(api._matching(route, query)):
+                        self._event("ADDED", obj)
+                    since = api._version
+                while not api._stopped.is_set() and (remaining := deadline - time.monotonic()) > 0:
+                    with api._changed:
+                        api._changed.wait(remaining)
+                        events = [e for e in api._history if e[0] > since]
+                    for version, event, key, obj in events:
+                        since = version
+                        in_scope = key[:2] == (route.prefix, route.plural) and (
+                            not route.namespace or key[2] == route.namespace
+                        )
+                        fields = query.get("fieldSelector", "")
+                        if in_scope and _selected(obj, query.get("labelSelector", ""), fields):
+                            self._event(event, obj)
+                self.close_connection = True
+                return 200
+
+            def _event(self, event: str, obj: Mapping):
+                self.wfile.write(json.dumps({"type": event, "object": obj}).encode() + b"\n")
+                self.wfile.flush()
+
+            def _post(self, route: _Route, query: Dict[str, str]) -> int:
+                obj = self._body()
+                route.name = obj["metadata"]["name"]
+                if route.key in api.objects:
+                    return self._status(409, f'{route.plural} "{route.name}" already exists')
+                if query.get("dryRun") != "All":
+                    api._store(route.key, obj, "ADDED")
+                self._reply(201, obj)
+                return 201
+
+            def _patch(self, route: _Route, query: Dict[str, str]) -> int:
+                patch = self._body()
+                current = api.objects.get(route.key)
+                if "apply-patch" in self.headers.get("Content-Type", ""):
+                    obj = deepcopy(patch)
+                    if current:
+                        obj["metadata"] = _merge(current["metadata"], patch.get("metadata", {}))
+                elif current is None:
+                    return self._not_found(route)
+                else:
+                    obj = _merge(current, patch)
+                if query.get("dryRun") != "All":
+                    api._store(route.key, obj, "MODIFIED" if current else "ADDED")
+                self._reply(200, obj)
+                return 200
+
+            def _delete(self, route: _Route, _: Dict[str, str]) -> int:
+                obj = api.objects.get(route.key)
+                if obj is None:
+                    return self._not_found(route)
+                api._store(route.key, deepcopy(obj), "DELETED")
+                self._reply(200, dict(kind="Status", apiVersion="v1", status="Success"))
+                return 200
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def do_PATCH(self):
+                self._serve("PATCH")
+
+            def do_DELETE(self):
+                self._serve("DELETE")
+
+        return Handler
@@ -0,0 +1,58 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+import unittest.mock as mock
+
+import certifi
+
+from ccm_metrics import MetricsSummary, parse, scrape
+
+METRICS = """\
+# HELP cloudprovider_gce_api_request_duration_seconds Latency of a GCE API call
+# TYPE cloudprovider_gce_api_request_duration_seconds histogram
+cloudprovider_gce_api_request_duration_seconds_bucket{request="get",le="+Inf"} 3
+cloudprovider_gce_api_request_duration_seconds_sum{request="get",region="us-east1"} 0.6
+cloudprovider_gce_api_request_duration_seconds_count{request="get",region="us-east1"} 3
+cloudprovider_gce_api_request_duration_seconds_sum{request="insert",region="us-east1"} 1.4
+cloudprovider_gce_api_request_duration_seconds_count{request="insert",region="us-east1"} 1
+cloudprovider_gce_api_request_errors{request="insert",region="us-east1"} 2
+workqueue_depth{name="service"} 4
+workqueue_depth{name="node"} 9
+workqueue_queue_duration_seconds_sum{name="service"} 0.5
+workqueue_queue_duration_seconds_count{name="service"} 10
+rest_client_request_duration_seconds_sum{host="127.0.0.1:6443",verb="GET"} 0.08
+rest_client_request_duration_seconds_count{host="127.0.0.1:6443",verb="GET"} 10
+"""
+
+
+def test_parse_labels():
+    samples = list(parse('a_metric{name="svc",path="/x\\"y"} 1.5\n# comment\nb 2'))
+    assert samples == [("a_metric", {"name": "svc", "path": '/x\\"y'}, 1.5), ("b", {}, 2.0)]
+
+
+def test_summary():
+    summary = MetricsSummary.from_text(METRICS)
+    assert summary == MetricsSummary(
+        gce_latency=0.5,
+        gce_errors=2,
+        queue_depth=4,
+        queue_latency=0.05,
+        sync_latency=None,
+        kube_latency=0.008,
+    )
+    assert str(summary) == "gce 500ms 2 err, queue 4 wait 50ms, lb -, kube 8ms"
+
+
+def test_scrape_unavailable():
+    ca = certifi.contents()
+    assert scrape("token", ca, "https://127.0.0.1:1/metrics", timeout=1.0) is None
+
+
+def test_scrape_authorized():
+    with mock.patch("ccm_metrics.httpx.get") as get:
+        get.return_value.text = METRICS
+        summary = scrape("token", certifi.contents())
+    assert summary and summary.queue_depth == 4
+    (url,), kwargs = get.call_args
+    assert url == "https://127.0.0.1:10258/metrics"
+    assert kwargs["headers"] == {"Authorization": "Bearer token"}
+    assert kwargs["verify"].verify_mode.name == "CERT_REQUIRED"
@@ -3,73 +3,28 @@
 #
 # Learn more about testing at: https://juju.is/docs/sdk/testing
 
+import json
+import time
 import unittest.mock as mock
-from ipaddress import ip_network
 from pathlib import Path
 
 import ops.testing
 import pytest
 import yaml
-from ops.model import BlockedStatus, MaintenanceStatus, WaitingStatus
+from lightkube.resources.core_v1 import Node
+from ops.manifests import ManifestClientError
+from ops.model import ActiveStatus, BlockedStatus, WaitingStatus
 from ops.testing import Harness
 
 from charm import GcpCloudProviderCharm
+from rollout import RolloutProgress
 
 ops.testing.SIMULATE_CAN_CONNECT = True
 
 
-@pytest.fixture
-def harness():
-    harness = Harness(GcpCloudProviderCharm)
-    try:
-        yield harness
-    finally:
-        harness.cleanup()
-
-
-@pytest.fixture(autouse=True)
-def mock_ca_cert(tmpdir):
-    ca_cert = Path(tmpdir) / "ca.crt"
-    with mock.patch.object(GcpCloudProviderCharm, "CA_CERT_PATH", ca_cert):
-        yield ca_cert
-
-
-@pytest.fixture()
-def gcp_integration():
-    with mock.patch("charm.GCPIntegrationRequires") as mocked:
-        integration = mocked.return_value
-        integration.evaluate_relation.return_value = None
-        integration.credentials = "abc"
-        yield integration
-
-
-@pytest.fixture()
-def certificates():
-    with mock.patch("charm.CertificatesRequires") as mocked:
-        certificates = mocked.return_value
-        certificates.ca = "abcd"
-        certificates.evaluate_relation.return_value = None
-        yield certificates
-
-
-@pytest.fixture()
-def kube_control():
-    with mock.patch("charm.KubeControlRequirer") as mocked:
-        kube_control = mocked.return_value
-        kube_control.evaluate_relation.return_value = None
-        kube_control.get_registry_location.return_value = "rocks.canonical.com/cdk"
-        kube_control.get_controller_taints.return_value = []
-        kube_control.get_controller_labels.return_value = []
-        kube_control.get_ca_certificate.return_value = None
-        kube_control.get_cluster_tag.return_value = "kubernetes-4ypskxahbu3rnfgsds3pksvwe3uh0lxt"
-        kube_control.get_cluster_cidr.return_value = ip_network("192.168.0.0/16")
-        kube_control.relation.app.name = "kubernetes-control-plane"
-        kube_control.relation.units = [f"kubernetes-control-plane/{_}" for _ in range(2)]
-        yield kube_control
-
-
 @pytest.mark.usefixtures("gcp_integration", "kube_control")
 def test_waits_for_certificates(harness):
+    harness.set_leader(True)
     harness.begin_with_initial_hooks()
     charm = harness.charm
     assert isinstance(charm.unit.status, BlockedStatus)
@@ -91,13 +46,13 @@ def test_waits_for_certificates(harness):
         "easyrsa/0",
         yaml.safe_load(Path("tests/data/certificates_data.yaml").read_text()),
     )
-    assert isinstance(charm.unit.status, MaintenanceStatus)
-    assert charm.unit.status.message == "Deploying GCP Cloud Provider"
+    assert charm.stored.deployed
 
 
 @mock.patch("ops.interface_kube_control.KubeControlRequirer.create_kubeconfig")
 @pytest.mark.usefixtures("gcp_integration", "certificates")
 def test_waits_for_kube_control(mock_create_kubeconfig, harness, caplog):
+    harness.set_leader(True)
     harness.begin_with_initial_hooks()
     charm = harness.charm
     assert isinstance(charm.unit.status, BlockedStatus)
@@ -128,7 +83,7 @@ def test_waits_for_kube_control(mock_create_kubeconfig, harness, caplog):
             mock.call(charm.CA_CERT_PATH, "/home/ubuntu/.kube/config", "ubuntu", charm.unit.name),
         ]
     )
-    assert charm.unit.status ==  MaintenanceStatus("Deploying GCP Cloud Provider")
+    assert charm.stored.deployed
     provider_messages = {r.message for r in caplog.records if "provider" in r.filename}
     assert provider_messages == {
        'Adding provider tolerations from control-plane',
@@ -138,7 +93,11 @@ def test_waits_for_kube_control(mock_create_kubeconfig, harness, caplog):
        'node-role.kubernetes.io/control-plane: "true"',
        'Encode cloud-config for cloud-controller.',
        'Encoding secret data for cloud-controller.',
+       "Patching DaemonSet/kube-system/cloud-controller-manager fields "
+       "['apiVersion', 'kind', 'metadata', 'spec'] (rollout=True)",
+       "Preflight cloud-provider-gcp version: v0.27.1",
        'Skip Loadbalancer RBAC Rule adjustments.',
+       'Tuning provider with custom performance profile',
     }
     caplog.clear()
 
@@ -146,6 +105,7 @@ def test_waits_for_kube_control(mock_create_kubeconfig, harness, caplog):
 @pytest.mark.usefixtures("certificates", "kube_control")
 def test_waits_for_config(harness: Harness, lk_client, caplog, gcp_integration):
     gcp_integration.is_ready = True
+    harness.set_leader(True)
     harness.begin_with_initial_hooks()
     with mock.patch.object(lk_client, "list") as mock_list:
         mock_list.return_value = [mock.Mock(**{"metadata.annotations": {}})]
@@ -165,7 +125,11 @@ def test_waits_for_config(harness: Harness, lk_client, caplog, gcp_integration):
             'Applying provider Control Node Selector as something.io/my-control-node: ""',
             "Encoding secret data for cloud-controller.",
             "Encode cloud-config for cloud-controller.",
+            "Patching DaemonSet/kube-system/cloud-controller-manager fields "
+            "['apiVersion', 'kind', 'metadata', 'spec'] (rollout=True)",
+            "Preflight cloud-provider-gcp version: v0.27.1",
             "Skip Loadbalancer RBAC Rule adjustments.",
+            "Tuning provider with custom performance profile",
         }
 
         caplog.clear()
@@ -179,7 +143,11 @@ def test_waits_for_config(harness: Harness, lk_client, caplog, gcp_integration):
             'Applying provider Control Node Selector as juju-application: "kubernetes-control-plane"',
             "Encoding secret data for cloud-controller.",
             "Encode cloud-config for cloud-controller.",
+            "Patching DaemonSet/kube-system/cloud-controller-manager fields "
+            "['apiVersion', 'kind', 'metadata', 'spec'] (rollout=True)",
+            "Preflight cloud-provider-gcp version: v0.27.1",
             "Skip Loadbalancer RBAC Rule adjustments.",
+            "Tuning provider with custom performance profile",
         }
 
 
@@ -193,3 +161,404 @@ def test_install_or_upgrade_apierror(harness: Harness, lk_client, api_error_klas
     charm._install_or_upgrade(mock_event)
     mock_event.defer.assert_called_once()
     assert isinstance(charm.unit.status, WaitingStatus)
+
+
+@pytest.mark.usefixtures("gcp_integration")
+def test_merge_config_rotates_credentials_only(harness: Harness):
+    harness.set_leader(True)
+    harness.begin()
+    charm = harness.charm
+    manifests = charm.collector.manifests["cloud-provider-gcp"]
+    checks = dict(_check_certificates=mock.DEFAULT, _check_kube_control=mock.DEFAULT)
+    with mock.patch.multiple(charm, **checks), mock.patch.multiple(
+        manifests,
+        evaluate=mock.MagicMock(return_value=None),
+        hash=mock.MagicMock(return_value=2),
+        base_hash=mock.MagicMock(return_value=1),
+        rotate_credentials=mock.DEFAULT,
+        apply_manifests=mock.DEFAULT,
+    ) as patched:
+        charm.stored.config_hash, charm.stored.base_hash, charm.stored.deployed = 1, 1, True
+        charm._merge_config(mock.MagicMock())
+        patched["rotate_credentials"].assert_called_once_with()
+        patched["apply_manifests"].assert_not_called()
+        assert charm.stored.config_hash == 2
+        assert charm.stored.deployed
+
+
+@pytest.mark.usefixtures("gcp_integration", "certificates", "kube_control")
+def test_non_leader_follows_leader(harness: Harness, lk_client):
+    harness.begin_with_initial_hooks()
+    charm = harness.charm
+    assert charm.unit.status == WaitingStatus("Waiting for leader to deploy")
+    lk_client.apply.assert_not_called()
+
+    rel_id = harness.model.get_relation("cloud-provider-peers").id
+    harness.update_relation_data(
+        rel_id,
+        charm.app.name,
+        {"status": '["active", "Ready"]', "version": '"v0.27.1"', "config-hash": "1"},
+    )
+    assert charm.unit.status == ActiveStatus("Ready")
+    lk_client.apply.assert_not_called()
+
+
+@pytest.mark.usefixtures("gcp_integration", "certificates", "kube_control")
+def test_leader_elected_adopts_published_state(harness: Harness):
+    rel_id = harness.add_relation("cloud-provider-peers", "gcp-cloud-provider")
+    harness.update_relation_data(
+        rel_id,
+        "gcp-cloud-provider",
+        {
+            "config-hash": "1",
+            "base-hash": "2",
+            "deployed": "true",
+            "profiles": '{"cloud-provider-gcp": "large"}',
+        },
+    )
+    harness.begin()
+    charm = harness.charm
+    with mock.patch.object(charm, "_merge_config") as merge_config:
+        harness.set_leader(True)
+    merge_config.assert_called_once()
+    assert charm.stored.config_hash == 1
+    assert charm.stored.base_hash == 2
+    assert charm.stored.deployed
+    assert charm.collector.manifests["cloud-provider-gcp"].sized_profile == "large"
+
+
+@pytest.mark.usefixtures("gcp_integration", "certificates", "kube_control")
+def test_nodes_counted_only_when_merging(harness: Harness, lk_client):
+    harness.update_config({"performance-profile": "auto"})
+    harness.set_leader(True)
+    harness.begin()
+    harness.charm.on.config_changed.emit()
+    assert harness.charm.stored.profiles["cloud-provider-gcp"] == "small"
+    assert Node in [call.args[0] for call in lk_client.list.call_args_list]
+
+    # each dispatch starts with a new charm
+    manifests = harness.charm.collector.manifests["cloud-provider-gcp"]
+    manifests.__dict__.pop("node_count")
+    manifests.resize = False
+    lk_client.reset_mock()
+    harness.charm.on.update_status.emit()
+    assert lk_client.method_calls
+    assert Node not in [call.args[0] for call in lk_client.list.call_args_list]
+
+
+def test_get_profile_action(harness: Harness, tmp_path):
+    with mock.patch.object(GcpCloudProviderCharm, "PROFILE_PATH", tmp_path):
+        harness.begin()
+        with pytest.raises(ops.testing.ActionFailed):
+            harness.run_action("get-profile")
+
+        harness.charm.profiler.start("update-status")
+        harness.charm.profiler.stop()
+        output = harness.run_action("get-profile", {"hook": "update-status", "limit": 5})
+    assert output.results["report"].endswith("-update-status.prof")
+    assert "function calls" in output.results["summary"]
+
+
+@pytest.mark.usefixtures("gcp_integration")
+def test_install_or_upgrade_preflight_rejected(harness: Harness, lk_client):
+    harness.begin()
+    charm = harness.charm
+    manifests = charm.collector.manifests["cloud-provider-gcp"]
+    rejections = ["DaemonSet/kube-system/cloud-controller-manager: invalid", "Role/x: invalid"]
+    mock_event = mock.MagicMock()
+    with mock.patch.object(manifests, "preflight", return_value=rejections):
+        assert not charm._install_or_upgrade(mock_event, config_hash=1)
+    mock_event.defer.assert_not_called()
+    lk_client.apply.assert_not_called()
+    assert charm.unit.status == BlockedStatus(
+        "Preflight rejected DaemonSet/kube-system/cloud-controller-manager: invalid (+1 more)"
+    )
+
+
+@pytest.fixture()
+def upgrade(harness: Harness):
+    harness.set_leader(True)
+    harness.begin()
+    manifests = harness.charm.collector.manifests["cloud-provider-gcp"]
+    harness.charm.stored.releases["cloud-provider-gcp"] = "v0.26.0"
+    with mock.patch.object(manifests, "preflight", return_value=[]), mock.patch.object(
+        manifests, "prepull"
+    ), mock.patch.object(manifests, "apply_manifests") as apply_manifests, mock.patch(
+        "charm.RolloutTracker"
+    ) as tracker:
+        yield tracker.return_value.check, apply_manifests
+
+
+def test_upgrade_healthy(harness: Harness, upgrade):
+    check, apply_manifests = upgrade
+    check.side_effect = [mock.MagicMock(complete=True), mock.MagicMock(complete=True)]
+    assert harness.charm._install_or_upgrade(mock.MagicMock(), config_hash=1)
+    apply_manifests.assert_called_once_with()
+    assert harness.charm.stored.releases["cloud-provider-gcp"] == "v0.27.1"
+    assert not harness.charm.stored.upgrades
+    assert not harness.charm.stored.release_pins
+
+
+def test_upgrade_waits_for_prepull(harness: Harness, upgrade):
+    check, apply_manifests = upgrade
+    check.return_value = mock.MagicMock(complete=False, unscheduled=False, __str__=lambda _: "1/3")
+    event = mock.MagicMock()
+    assert not harness.charm._install_or_upgrade(event, config_hash=1)
+    event.defer.assert_not_called()
+    apply_manifests.assert_not_called()
+    assert harness.charm.stored.upgrades["cloud-provider-gcp"]["phase"] == "prepull"
+    assert harness.charm.unit.status == WaitingStatus("Pre-pulling v0.27.1 image: 1/3")
+
+
+@pytest.mark.parametrize("healthy", [True, False])
+def test_upgrade_health_checked_on_update_status(harness: Harness, upgrade, healthy):
+    check, apply_manifests = upgrade
+    rolling = mock.MagicMock(complete=False, unscheduled=False, __str__=lambda _: "1/3")
+    check.side_effect = [mock.MagicMock(complete=True), rolling]
+    assert harness.charm._install_or_upgrade(mock.MagicMock(), config_hash=1)
+    assert harness.charm.stored.upgrades["cloud-provider-gcp"]["phase"] == "health"
+    assert harness.charm.stored.releases["cloud-provider-gcp"] == "v0.26.0"
+    assert harness.charm.unit.status == WaitingStatus(
+        "Upgrading cloud-controller-manager to v0.27.1: 1/3"
+    )
+
+    check.side_effect = [mock.MagicMock(complete=healthy, unscheduled=False)]
+    timeout = harness.charm.UPGRADE_TIMEOUT + 1
+    with mock.patch("charm.time.time", return_value=time.time() + timeout):
+        harness.charm.on.update_status.emit()
+    manifests = harness.charm.collector.manifests["cloud-provider-gcp"]
+    assert not harness.charm.stored.upgrades
+    if healthy:
+        apply_manifests.assert_called_once_with()
+        assert harness.charm.stored.releases["cloud-provider-gcp"] == "v0.27.1"
+        assert harness.charm.unit.status == ActiveStatus("Ready")
+    else:
+        assert apply_manifests.call_count == 2
+        assert manifests.current_release == "v0.26.0"
+        assert harness.charm.stored.releases["cloud-provider-gcp"] == "v0.26.0"
+        assert harness.charm.stored.config_hash == harness.charm._hashes()[0]
+        assert harness.charm.stored.deployed
+        assert harness.charm.unit.status == BlockedStatus(
+            "v0.27.1 unhealthy, rolled back to v0.26.0"
+        )
+
+
+def test_upgrade_waits_while_unscheduled(harness: Harness, upgrade):
+    check, _ = upgrade
+    pending = mock.MagicMock(complete=False, unscheduled=True, __str__=lambda _: "0/2")
+    check.side_effect = [mock.MagicMock(complete=True), pending]
+    assert harness.charm._install_or_upgrade(mock.MagicMock(), config_hash=1)
+    assert harness.charm.stored.upgrades["cloud-provider-gcp"]["phase"] == "health"
+    assert harness.charm.stored.releases["cloud-provider-gcp"] == "v0.26.0"
+
+    check.side_effect = None
+    check.return_value = mock.MagicMock(complete=False, unscheduled=True)
+    event = mock.MagicMock()
+    assert not harness.charm._install_or_upgrade(event, config_hash=2)
+    assert harness.charm.unit.status == WaitingStatus("Pre-pulling v0.27.1 image: no nodes")
+
+
+def test_rollback_retried_after_apply_error(harness: Harness, upgrade):
+    check, apply_manifests = upgrade
+    rolling = mock.MagicMock(complete=False, unscheduled=False)
+    check.side_effect = [mock.MagicMock(complete=True), rolling, rolling, rolling]
+    assert harness.charm._install_or_upgrade(mock.MagicMock(), config_hash=1)
+    manifests = harness.charm.collector.manifests["cloud-provider-gcp"]
+
+    apply_manifests.side_effect = ManifestClientError("unavailable")
+    timeout = harness.charm.UPGRADE_TIMEOUT + 1
+    with mock.patch("charm.time.time", return_value=time.time() + timeout):
+        harness.charm.on.update_status.emit()
+        assert harness.charm.unit.status == WaitingStatus("Waiting for kube-apiserver")
+        assert harness.charm.stored.upgrades["cloud-provider-gcp"]["phase"] == "health"
+        assert not harness.charm.stored.release_pins
+        assert manifests.current_release == "v0.27.1"
+        assert not harness.charm._rolled_back()
+
+        apply_manifests.side_effect = None
+        harness.charm.on.update_status.emit()
+    assert not harness.charm.stored.upgrades
+    assert manifests.current_release == "v0.26.0"
+    assert harness.charm.unit.status == BlockedStatus("v0.27.1 unhealthy, rolled back to v0.26.0")
+
+
+@pytest.mark.parametrize(
+    "available, unschedulable, message",
+    [
+        (0, 2, "cloud-controller-manager scheduled on no nodes, check control-node-selector"),
+        (
+            1,
+            1,
+            "cloud-controller-manager 1/2 available, "
+            "more controller-replicas than matching nodes",
+        ),
+    ],
+)
+def test_track_rollouts_unscheduled(harness: Harness, available, unschedulable, message):
+    harness.begin()
+    manifests = harness.charm.collector.manifests["cloud-provider-gcp"]
+    manifests.pending_rollouts = [mock.MagicMock()]
+    manifests.pending_rollouts[0].name = "cloud-controller-manager"
+    progress = RolloutProgress(
+        desired=2,
+        updated=2,
+        available=available,
+        observed=True,
+        seen=True,
+        pods=2,
+        unschedulable=unschedulable,
+    )
+    with mock.patch("charm.RolloutTracker") as tracker:
+        tracker.return_value.track.return_value = progress
+        harness.charm._track_rollouts()
+    assert harness.charm.unit.status == BlockedStatus(message)
+
+
+@pytest.mark.parametrize("release, pinned", [(None, True), ("v0.27.1", False)])
+def test_release_pin_cleared_by_config(harness: Harness, release, pinned):
+    harness.set_leader(True)
+    harness.begin()
+    charm = harness.charm
+    manifests = charm.collector.manifests["cloud-provider-gcp"]
+    pin = {"failed": "v0.27.1", "rollback": "v0.26.0", "config": None}
+    charm.stored.release_pins["cloud-provider-gcp"] = pin
+    charm._pin_releases()
+    assert manifests.current_release == "v0.26.0"
+
+    if release:
+        harness.update_config({"provider-release": release})
+    charm._clear_stale_pins()
+    assert bool(charm.stored.release_pins) is pinned
+    assert manifests.current_release == ("v0.26.0" if pinned else "v0.27.1")
+
+
+@pytest.mark.usefixtures("gcp_integration", "kube_control")
+def test_metrics_endpoint_offers_scrape_job(harness: Harness, certificates, lk_client):
+    certificates.server_certs_map = {}
+    lk_client.get.return_value.data = {"token": "dG9rZW4="}
+    harness.set_leader(True)
+    harness.begin()
+    harness.add_relation("certificates", "easyrsa")
+    rel_id = harness.add_relation("metrics-endpoint", "prometheus")
+    harness.add_relation_unit(rel_id, "prometheus/0")
+
+    certificates.request_server_cert.assert_called_with(
+        "cloud-controller-manager", ["127.0.0.1", "192.0.2.0"]
+    )
+    unit_data = harness.get_relation_data(rel_id, harness.charm.unit.name)
+    assert unit_data["prometheus_scrape_unit_name"] == harness.charm.unit.name
+    # the job isn't offered until the controllers serve a certificate signed by the CA
+    assert "scrape_jobs" not in harness.get_relation_data(rel_id, harness.charm.app.name)
+
+    certificates.server_certs_map = {
+        "cloud-controller-manager": mock.MagicMock(cert="cert", key="key")
+    }
+    harness.charm.on.config_changed.emit()
+    app_data = harness.get_relation_data(rel_id, harness.charm.app.name)
+    (job,) = yaml.safe_load(app_data["scrape_jobs"])
+    assert job["static_configs"] == [{"targets": ["*:10258"]}]
+    assert job["authorization"] == {"credentials": "token"}
+    assert job["tls_config"] == {"ca_file": "abcd"}
+
+
+def test_serving_cert_follows_peers(harness: Harness, certificates):
+    certificates.server_certs_map = {}
+    harness.set_leader(True)
+    harness.begin()
+    harness.add_relation("certificates", "easyrsa")
+    harness.add_relation("metrics-endpoint", "prometheus")
+    rel_id = harness.add_relation("cloud-provider-peers", "gcp-cloud-provider")
+    harness.add_relation_unit(rel_id, "gcp-cloud-provider/1")
+    harness.update_relation_data(rel_id, "gcp-cloud-provider/1", {"ingress-address": "192.0.2.1"})
+    certificates.request_server_cert.assert_called_with(
+        "cloud-controller-manager", ["127.0.0.1", "192.0.2.0", "192.0.2.1"]
+    )
+
+    harness.remove_relation_unit(rel_id, "gcp-cloud-provider/1")
+    certificates.request_server_cert.assert_called_with(
+        "cloud-controller-manager", ["127.0.0.1", "192.0.2.0"]
+    )
+
+
+@pytest.mark.parametrize("holder, scraped", [("juju-0", True), ("juju-1", False)])
+def test_metrics_summary_of_active_controller(harness: Harness, holder, scraped):
+    harness.set_leader(True)
+    harness.begin()
+    harness.add_relation("metrics-endpoint", "prometheus")
+    with mock.patch("charm.socket.gethostname", return_value="juju-0"), mock.patch.object(
+        harness.charm, "_metrics_credentials", return_value=("token", "ca")
+    ), mock.patch("charm.scrape", return_value="gce 1ms 0 err") as scrape:
+        summary = harness.charm._metrics_summary(holder)
+    assert summary == ("gce 1ms 0 err" if scraped else "")
+    assert scrape.called is scraped
+
+
+def test_show_journal(harness: Harness):
+    harness.begin()
+    journal = harness.charm.journal
+    for hook in ("install", "config-changed", "update-status"):
+        journal.start(hook)
+        journal.note("stopped", "certificates")
+        journal.commit()
+    output = harness.run_action("show-journal", {"limit": 2})
+    entries = [json.loads(line) for line in output.results["journal"].splitlines()]
+    assert [entry["hook"] for entry in entries] == ["config-changed", "update-status"]
+    assert entries[-1]["stopped"] == "certificates"
+
+
+def test_update_status_backs_off_while_stable(harness: Harness):
+    harness.set_leader(True)
+    harness.begin()
+    charm = harness.charm
+    charm.stored.deployed = True
+    with mock.patch.object(charm, "collector") as collector, mock.patch.object(
+        charm, "_check_certificates", return_value=False
+    ):
+        collector.manifests = {}
+        collector.short_version = collector.long_version = "v0.27.1"
+        unready = mock.PropertyMock(return_value=[])
+        type(collector).unready = unready
+        checked = []
+        for hook in range(1, 14):
+            before = unready.call_count
+            charm.on.update_status.emit()
+            if unready.call_count > before:
+                checked.append(hook)
+        assert checked == [1, 2, 3, 5, 8, 13]
+
+        charm.on.config_changed.emit()
+        charm.on.update_status.emit()
+        assert unready.call_count == len(checked) + 1
+
+        unready.return_value = ["Waiting for cloud-controller-manager"]
+        for _ in range(3):
+            charm.on.update_status.emit()
+        assert unready.call_count == len(checked) + 4
+        assert charm.stored.skip_checks == 0
+
+
+def test_skipped_status_check_reads_the_workload(harness: Harness):
+    harness.set_leader(True)
+    harness.begin()
+    charm = harness.charm
+    charm.stored.deployed = True
+    charm.stored.stable_checks = charm.STABLE_CHECKS
+    charm.stored.skip_checks = 2
+    with mock.patch.object(charm, "collector") as collector, mock.patch(
+        "charm.RolloutTracker"
+    ) as tracker:
+        controller = mock.MagicMock(active_controllers=[])
+        collector.manifests = {"cloud-provider-gcp": controller}
+        collector.unready = []
+        check = tracker.return_value.check
+        check.return_value = RolloutProgress(desired=2, updated=2, available=2, observed=True)
+        charm.on.update_status.emit()
+        check.assert_called_once_with(controller.controller_workload)
+        assert charm.stored.skip_checks == 1
+
+        # a rollout no longer complete resets the cadence and checks in full
+        check.return_value = RolloutProgress(desired=2, updated=1, available=1, observed=True)
+        collector.unready = ["Waiting for cloud-controller-manager"]
+        charm.on.update_status.emit()
+        assert (charm.stored.stable_checks, charm.stored.skip_checks) == (0, 0)
+        assert charm.unit.status == WaitingStatus("Waiting for cloud-controller-manager")
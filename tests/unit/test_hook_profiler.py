@@ -0,0 +1,39 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+import unittest.mock as mock
+from pathlib import Path
+
+from hook_profiler import HookProfiler
+
+
+def test_enabled():
+    assert HookProfiler.enabled("config-changed", "update-status config-changed")
+    assert HookProfiler.enabled("install", "*")
+    assert not HookProfiler.enabled("install", "update-status")
+    assert not HookProfiler.enabled("", "*")
+
+
+def test_profile_ring(tmp_path: Path):
+    profiler = HookProfiler(tmp_path, keep=2)
+    # dispatches in the same instant are told apart by their pid
+    with mock.patch("hook_profiler.time.time", return_value=1704067200.5), mock.patch(
+        "hook_profiler.getpid", side_effect=[101, 102, 103]
+    ):
+        for hook in ("install", "config-changed", "config-changed"):
+            profiler.start(hook, memory=True)
+            sorted(range(1000), key=lambda x: -x)
+            profiler.stop()
+
+    reports = profiler.reports()
+    assert [p.name.split(".", 1)[1] for p in reports] == [
+        "500000-103-config-changed.prof",
+        "500000-102-config-changed.prof",
+    ]
+    assert not list(tmp_path.glob("*-101-install.*"))
+    assert profiler.reports("install") == []
+    assert profiler.reports("changed") == []
+    assert profiler.reports("config-changed") == reports
+
+    summary = HookProfiler.summary(reports[0], limit=5)
+    assert "function calls" in summary
+    assert "peak=" in summary
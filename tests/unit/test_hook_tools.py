@@ -0,0 +1,14 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+import unittest.mock as mock
+
+from hook_tools import HookToolCounter
+
+
+def test_hook_tool_counter():
+    backend = mock.MagicMock(spec=["relation_get", "relation_ids"])
+    counter = HookToolCounter(backend)
+    backend.relation_get(1, "unit/0", False)
+    backend.relation_get(1, "unit/1", False)
+    backend.relation_ids("kube-control")
+    assert str(counter) == "relation-get=2 relation-ids=1"
@@ -0,0 +1,38 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+from journal import DecisionJournal
+
+
+def test_journal_records_dispatch(tmp_path):
+    journal = DecisionJournal(tmp_path / "journal.jsonl")
+    journal.start("config-changed")
+    journal.note("stopped", "kube-control")
+    journal.note("install", "skipped")
+    journal.note("install", "deferred")
+    journal.touched("Secret/kube-system/gcp-cloud-secret")
+    with journal.stage("apply"):
+        pass
+    journal.commit()
+
+    (entry,) = journal.entries()
+    assert entry["hook"] == "config-changed"
+    assert entry["stopped"] == "kube-control"
+    assert entry["install"] == "deferred"
+    assert entry["touched"] == ["Secret/kube-system/gcp-cloud-secret"]
+    assert set(entry["stages"]) == {"apply"}
+    assert entry["duration"] >= entry["stages"]["apply"]
+
+
+def test_journal_ring(tmp_path):
+    journal = DecisionJournal(tmp_path / "journal.jsonl", keep=3)
+    for hook in ("install", "start", "update-status", "update-status", "stop"):
+        journal.start(hook)
+        journal.commit()
+    assert [entry["hook"] for entry in journal.entries(10)] == [
+        "update-status",
+        "update-status",
+        "stop",
+    ]
+    assert [entry["hook"] for entry in journal.entries(1)] == ["stop"]
+    journal.commit()  # nothing started
+    assert len(journal.entries(10)) == 3
@@ -0,0 +1,49 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+import pytest
+from ops.manifests.manifest import FILE_TYPES
+
+
+def test_load_manifests(manifests, memory_budget):
+    with memory_budget("load-manifests"):
+        loaded = [
+            manifests._resource_from_yaml(yml)
+            for release in manifests.releases
+            for ext in FILE_TYPES
+            for yml in sorted((manifests.manifest_path / release).glob(f"*.{ext}"))
+        ]
+    assert loaded
+
+
+def test_config(manifests, memory_budget):
+    with memory_budget("config"):
+        config = manifests.config
+    assert config["release"] == "v0.27.1"
+
+
+def test_render(manifests, memory_budget):
+    with memory_budget("render"):
+        resources = manifests.resources
+    assert resources
+
+
+def test_hash(manifests, memory_budget):
+    with memory_budget("hash"):
+        assert manifests.hash()
+
+
+@pytest.mark.usefixtures("gcp_integration", "certificates", "kube_control")
+@pytest.mark.parametrize(
+    "hook", ["install", "upgrade-charm", "leader-elected", "config-changed", "update-status"]
+)
+def test_hook(harness, kube_api, memory_budget, hook):
+    harness.set_leader(True)
+    harness.begin()
+    # deploy first, so the hook is measured against a deployed cluster
+    harness.charm.on.config_changed.emit()
+    assert harness.charm.stored.deployed
+    kube_api.requests.clear()
+    event = getattr(harness.charm.on, hook.replace("-", "_"))
+    with memory_budget(f"hook/{hook}"):
+        event.emit()
+    assert kube_api.requests
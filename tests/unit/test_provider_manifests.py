@@ -0,0 +1,379 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+import base64
+import unittest.mock as mock
+from copy import deepcopy
+from hashlib import sha256
+
+import pytest
+import yaml
+from lightkube.codecs import from_dict
+from lightkube.core.exceptions import ApiError, ConfigError
+from lightkube.resources.core_v1 import Node
+from lightkube.types import PatchType
+from ops.manifests import ManifestClientError
+
+from provider_manifests import PERFORMANCE_PROFILES, SERVING_NAME, minimal_patch
+
+
+def _workload(manifests):
+    return next(rsc for rsc in manifests.resources if rsc.kind == "DaemonSet")
+
+
+def _live(manifests):
+    return from_dict(deepcopy(_workload(manifests).resource.to_dict()))
+
+
+def test_minimal_patch_ignores_server_defaults():
+    desired = {"spec": {"template": {"spec": {"containers": [{"name": "a", "args": ["x"]}]}}}}
+    container = {"name": "a", "args": ["x"], "terminationMessagePath": "/"}
+    live = {
+        "spec": {"revisionHistoryLimit": 10, "template": {"spec": {"containers": [container]}}},
+        "status": {"numberReady": 1},
+    }
+    assert minimal_patch(desired, live) == {}
+
+    desired["spec"]["template"]["spec"]["containers"][0]["args"] = ["y"]
+    assert minimal_patch(desired, live) == {
+        "spec": {"template": {"spec": {"containers": [{"name": "a", "args": ["y"]}]}}}
+    }
+
+
+def test_minimal_patch_removes_stale_node_selector():
+    desired = {"nodeSelector": {"a": "1"}}
+    live = {"nodeSelector": {"a": "1", "b": "2"}}
+    assert minimal_patch(desired, live) == {"nodeSelector": {"b": None}}
+
+
+def test_apply_unchanged_workload(manifests, lk_client):
+    workload = _workload(manifests)
+    lk_client.get.return_value = workload.resource
+    manifests.apply_resources(workload)
+    lk_client.patch.assert_not_called()
+    lk_client.apply.assert_not_called()
+    assert manifests.pending_rollouts == []
+
+
+def test_apply_metadata_only_change(manifests, lk_client):
+    workload = _workload(manifests)
+    live = _live(manifests)
+    live.metadata.labels["component"] = "other"
+    lk_client.get.return_value = live
+    manifests.apply_resources(workload)
+    lk_client.patch.assert_called_once_with(
+        type(workload.resource),
+        "cloud-controller-manager",
+        {"metadata": {"labels": {"component": "cloud-controller-manager"}}},
+        namespace="kube-system",
+        patch_type=PatchType.MERGE,
+    )
+    assert manifests.pending_rollouts == []
+
+
+def test_apply_template_change(manifests, lk_client):
+    workload = _workload(manifests)
+    live = _live(manifests)
+    live.spec.template.spec.containers[0].args = []
+    lk_client.get.return_value = live
+    manifests.apply_resources(workload)
+    patch = lk_client.patch.call_args.args[2]
+    assert list(patch["spec"]["template"]["spec"]) == ["containers"]
+    assert [str(_) for _ in manifests.pending_rollouts] == [
+        "DaemonSet/kube-system/cloud-controller-manager"
+    ]
+
+
+def test_rotate_credentials(manifests, lk_client):
+    live = _live(manifests)
+    lk_client.get.return_value = live
+    manifests.integrator.credentials = "def"
+    manifests.rotate_credentials()
+
+    applied = [(obj.kind, obj.metadata.name) for (obj,), _ in lk_client.apply.call_args_list]
+    assert applied == [("ConfigMap", "cloudconfig"), ("Secret", "gcp-cloud-secret")]
+    patch = lk_client.patch.call_args.args[2]
+    assert patch == {
+        "spec": {
+            "template": {
+                "metadata": {
+                    "annotations": {
+                        "juju.io/credentials-checksum": sha256(b"def").hexdigest(),
+                    }
+                }
+            }
+        }
+    }
+    assert [str(_) for _ in manifests.pending_rollouts] == [
+        "DaemonSet/kube-system/cloud-controller-manager"
+    ]
+
+
+def test_base_hash_ignores_credentials(manifests):
+    base_hash, full_hash = manifests.base_hash(), manifests.hash()
+    manifests.integrator.credentials = "def"
+    assert manifests.base_hash() == base_hash
+    assert manifests.hash() != full_hash
+
+
+def _args(manifests):
+    return _workload(manifests).resource.spec.template.spec.containers[0].args
+
+
+@pytest.mark.parametrize("nodes, profile", [(3, "small"), (500, "large")])
+def test_auto_performance_profile(manifests, lk_client, nodes, profile):
+    node_list = [mock.MagicMock()] * nodes
+    lk_client.list.side_effect = lambda kind, **_: node_list if kind is Node else []
+    manifests.charm_config.available_data["performance-profile"] = "auto"
+    manifests.charm_config.available_data["controller-extra-args"] = {"v": "3"}
+    assert manifests.config["performance-profile"] == "custom"
+    lk_client.list.assert_not_called()
+
+    manifests.resize = True
+    assert manifests.config["performance-profile"] == profile
+    assert manifests.sized_profile == profile
+    args = _args(manifests)
+    expected_qps = PERFORMANCE_PROFILES[profile]["kube-api-qps"]
+    assert f"--kube-api-qps={expected_qps}" in args
+    assert [arg for arg in args if arg.startswith("--v=")] == ["--v=3"]
+
+
+@pytest.mark.parametrize("error", [ApiError, ConfigError])
+def test_unreachable_cluster_keeps_profile(manifests, lk_client, api_error_klass, error):
+    lk_client.list.side_effect = api_error_klass if error is ApiError else ConfigError
+    manifests.charm_config.available_data["performance-profile"] = "auto"
+    manifests.resize = True
+    assert manifests.config["performance-profile"] == "custom"
+
+    manifests.sized_profile = "large"
+    assert manifests.config["performance-profile"] == "large"
+
+
+def test_deployment_mode(manifests):
+    manifests.charm_config.available_data["deploy-mode"] = "deployment"
+    manifests.charm_config.available_data["controller-replicas"] = 3
+    workloads = [rsc for rsc in manifests.resources if rsc.kind in ("DaemonSet", "Deployment")]
+    assert [str(rsc) for rsc in workloads] == ["Deployment/kube-system/cloud-controller-manager"]
+
+    deployment = workloads[0].resource
+    assert deployment.spec.replicas == 3
+    pod = deployment.spec.template.spec
+    assert pod.nodeSelector == {"juju-application": "kubernetes-control-plane"}
+    anti_affinity = pod.affinity.podAntiAffinity.requiredDuringSchedulingIgnoredDuringExecution
+    assert anti_affinity[0].topologyKey == "kubernetes.io/hostname"
+    assert pod.containers[0].args[0] == "--cloud-provider=gce"
+
+
+def test_apply_manifests_removes_replaced_workload(manifests, lk_client):
+    manifests.charm_config.available_data["deploy-mode"] = "deployment"
+    with mock.patch.object(manifests, "delete_resources") as delete_resources:
+        manifests.apply_manifests()
+    (replaced,), kwargs = delete_resources.call_args
+    assert str(replaced) == "DaemonSet/kube-system/cloud-controller-manager"
+    assert kwargs == {"ignore_not_found": True}
+
+
+def test_preflight_collects_rejections(manifests, lk_client, api_error_klass):
+    def dry_run(obj, **kwargs):
+        assert kwargs == {"force": True, "dry_run": True}
+        if obj.kind in ("DaemonSet", "ClusterRole"):
+            rejected = api_error_klass()
+            rejected.status.code = 422
+            rejected.status.message = f"{obj.kind} is invalid"
+            raise rejected
+
+    lk_client.apply.side_effect = dry_run
+    rejections = manifests.preflight()
+    assert rejections == [
+        "DaemonSet/kube-system/cloud-controller-manager: DaemonSet is invalid",
+        "ClusterRole/system:cloud-controller-manager: ClusterRole is invalid",
+        "ClusterRole/system:controller:cloud-node-controller: ClusterRole is invalid",
+        "ClusterRole/system:controller:pvl-controller: ClusterRole is invalid",
+    ]
+    lk_client.patch.assert_not_called()
+
+
+def test_preflight_unavailable(manifests, lk_client, api_error_klass):
+    unavailable = api_error_klass()
+    unavailable.status.code = 503
+    lk_client.apply.side_effect = unavailable
+    with pytest.raises(ManifestClientError):
+        manifests.preflight()
+
+
+def test_stale_resources(manifests, tmp_path):
+    current = manifests.manifest_path / "v0.27.1" / "manifest.yaml"
+    (tmp_path / "v0.27.1").mkdir()
+    (tmp_path / "v0.27.1" / "manifest.yaml").write_text(current.read_text())
+    (tmp_path / "v0.26.0").mkdir()
+    retired = {
+        "apiVersion": "v1",
+        "kind": "ConfigMap",
+        "metadata": {"name": "retired", "namespace": "kube-system"},
+    }
+    (tmp_path / "v0.26.0" / "manifest.yaml").write_text(
+        current.read_text() + "---\n" + yaml.safe_dump(retired)
+    )
+    manifests.manifest_path = tmp_path
+
+    assert [str(rsc) for rsc in manifests.stale_resources("v0.26.0")] == [
+        "ConfigMap/kube-system/retired"
+    ]
+    assert manifests.stale_resources("v0.25.0") == frozenset()
+
+
+def test_prepull(manifests, lk_client):
+    controller = _workload(manifests).resource.spec.template.spec
+    assert controller.containers[0].readinessProbe.httpGet.port == 10258
+
+    rsc = manifests.prepull()
+    (obj,), kwargs = lk_client.apply.call_args
+    assert obj is rsc.resource and kwargs == {"force": True}
+    assert str(rsc) == "DaemonSet/kube-system/cloud-controller-manager-prepull"
+    assert obj.metadata.labels["juju.io/manifest"] == "cloud-provider-gcp"
+    pod = obj.spec.template.spec
+    assert pod.nodeSelector == controller.nodeSelector
+    assert pod.affinity.nodeAffinity == controller.affinity.nodeAffinity
+    assert pod.initContainers[0].image == controller.containers[0].image
+    assert pod.containers[0].image == "rocks.canonical.com/cdk/pause:3.9"
+
+
+def test_release_pin(manifests):
+    manifests.release_pin = {"failed": "v0.27.1", "rollback": "v0.26.0"}
+    assert manifests.current_release == "v0.26.0"
+    assert manifests.config["rolled-back-from"] == "v0.27.1"
+
+    manifests.charm_config.available_data["provider-release"] = "v0.28.0"
+    assert manifests.current_release == "v0.28.0"
+    assert "rolled-back-from" not in manifests.config
+
+
+def test_images_use_registry_and_digests(manifests):
+    container = _workload(manifests).resource.spec.template.spec.containers[0]
+    assert container.image == "rocks.canonical.com/cdk/cloud-controller-manager:latest"
+
+    manifests.image_digests = {
+        "v0.27.1": {"k8scloudprovidergcp/cloud-controller-manager:latest": "sha256:abcd"}
+    }
+    container = _workload(manifests).resource.spec.template.spec.containers[0]
+    assert container.image == "rocks.canonical.com/cdk/cloud-controller-manager:latest@sha256:abcd"
+
+
+def test_apply_against_api_server(manifests, kube_api):
+    manifests.apply_manifests()
+    assert manifests.installed_resources() == frozenset(manifests.resources)
+    daemonset = kube_api.get("daemonsets", "cloud-controller-manager", "kube-system")
+    assert daemonset["metadata"]["generation"] == 1
+
+    kube_api.requests.clear()
+    manifests.apply_manifests()
+    assert kube_api.count("PATCH", "/daemonsets/") == 0
+    assert kube_api.get("daemonsets", "cloud-controller-manager", "kube-system") == daemonset
+
+
+def test_apply_retries_after_api_fault(manifests, kube_api):
+    kube_api.fail(503, path="/secrets/")
+    with pytest.raises(ManifestClientError):
+        manifests.apply_manifests()
+    assert kube_api.get("secrets", "gcp-cloud-secret", "kube-system") is None
+
+    manifests.apply_manifests()
+    assert kube_api.get("secrets", "gcp-cloud-secret", "kube-system")
+    assert kube_api.count("PATCH", "/secrets/gcp-cloud-secret") == 2
+
+
+def test_delete_manifests_against_api_server(manifests, kube_api):
+    manifests.apply_manifests()
+    kube_api.fail(401, times=3, method="DELETE", path="/clusterroles/")
+    manifests.delete_manifests(ignore_unauthorized=True)
+    assert {key[1] for key in kube_api.objects} == {"clusterroles"}
+
+
+def test_metrics_related(manifests):
+    unrelated = {(rsc.kind, rsc.name) for rsc in manifests.resources}
+    manifests.model.relations = {"metrics-endpoint": [mock.MagicMock()]}
+    added = {(rsc.kind, rsc.name) for rsc in manifests.resources} - unrelated
+    assert added == {
+        ("ServiceAccount", "cloud-controller-manager-metrics"),
+        ("Secret", "cloud-controller-manager-metrics"),
+        ("ClusterRole", "system:cloud-controller-manager-metrics"),
+        ("ClusterRoleBinding", "system:cloud-controller-manager-metrics"),
+        ("ClusterRoleBinding", "cloud-controller-manager:auth-delegator"),
+    }
+    assert not [arg for arg in _args(manifests) if arg.startswith("--tls-")]
+    assert not [arg for arg in _args(manifests) if "always-allow-paths" in arg]
+
+    manifests.serving_cert = ("cert", "key")
+    assert "--tls-cert-file=/etc/kubernetes/serving/tls.crt" in _args(manifests)
+    serving = next(rsc for rsc in manifests.resources if rsc.name == SERVING_NAME)
+    assert serving.resource.type == "kubernetes.io/tls"
+    volumes = _workload(manifests).resource.spec.template.spec.volumes
+    assert volumes[-1].secret.secretName == SERVING_NAME
+
+
+def test_metrics_token(manifests, lk_client, api_error_klass):
+    lk_client.get.return_value.data = {"token": base64.b64encode(b"abc").decode()}
+    assert manifests.metrics_token() == "abc"
+    lk_client.get.return_value.data = None
+    assert manifests.metrics_token() is None
+    not_found = api_error_klass()
+    not_found.status.code = 404
+    lk_client.get.side_effect = not_found
+    assert manifests.metrics_token() is None
+
+
+def test_active_instance(manifests, lk_client):
+    lk_client.get.return_value.spec.holderIdentity = "juju-0a1b2c-0_3f1d-4c2e"
+    assert manifests.active_instance() == "juju-0a1b2c-0"
+    lk_client.get.return_value.spec.holderIdentity = None
+    assert manifests.active_instance() is None
+
+
+@pytest.mark.parametrize(
+    "controllers, expected",
+    [
+        ([], "cloud-node,cloud-node-lifecycle,service"),
+        (["service", "cloud-node"], "cloud-node,service"),
+        (["*", "-nodeipam", "-route"], "cloud-node,cloud-node-lifecycle,service"),
+    ],
+)
+def test_controllers(manifests, controllers, expected):
+    manifests.charm_config.available_data["controllers"] = controllers
+    assert manifests.evaluate() is None
+    assert [arg for arg in _args(manifests) if arg.startswith("--controllers")] == [
+        f"--controllers={expected}"
+    ]
+
+
+@pytest.mark.parametrize(
+    "controllers, message",
+    [
+        (["service", "-ipam"], "Config controllers unknown: -ipam"),
+        (["-service"], "Config controllers enables no controllers"),
+    ],
+)
+def test_controllers_invalid(manifests, controllers, message):
+    manifests.charm_config.available_data["controllers"] = controllers
+    assert manifests.evaluate() == message
+
+
+def test_cloud_config(manifests):
+    workload = _workload(manifests).resource
+    checksum = workload.spec.template.metadata.annotations["juju.io/cloud-config-checksum"]
+    manifests.integrator.credentials = '{"type": "service_account", "project_id": "my-project"}'
+    manifests.charm_config.available_data.update(
+        {"network-name": "net", "node-tags": "k8s-a k8s-b", "regional": True}
+    )
+    assert manifests.cloud_config.splitlines() == [
+        "[Global]",
+        "token-url = nil",
+        "multizone = true",
+        "project-id = my-project",
+        "network-name = net",
+        "node-tags = k8s-a",
+        "node-tags = k8s-b",
+        "regional = true",
+    ]
+    (config_map,) = [rsc.resource for rsc in manifests.resources if rsc.kind == "ConfigMap"]
+    assert config_map.data["cloud.config"] == manifests.cloud_config
+    annotations = _workload(manifests).resource.spec.template.metadata.annotations
+    assert annotations["juju.io/cloud-config-checksum"] != checksum
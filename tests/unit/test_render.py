@@ -0,0 +1,61 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+from pathlib import Path
+
+import pytest
+import yaml
+
+from upstream import render
+
+DESCRIPTION = {
+    "config": {"provider-release": "v0.27.1"},
+    "kube-control": {
+        "labels": ["node-role.kubernetes.io/control-plane="],
+        "taints": ["node-role.kubernetes.io/control-plane:NoSchedule"],
+        "cluster-tag": "kubernetes-abcd",
+    },
+    "credentials": '{"project_id": "my-project"}',
+}
+
+
+@pytest.fixture()
+def fleet(tmp_path: Path) -> Path:
+    (tmp_path / "prod.yaml").write_text(yaml.safe_dump(DESCRIPTION))
+    (tmp_path / "incomplete.yaml").write_text(yaml.safe_dump({"kube-control": {}}))
+    return tmp_path
+
+
+def test_render_cluster(fleet):
+    rendered = render.render_cluster(fleet / "prod.yaml", {})
+    assert not rendered.error
+    resources = {
+        (rsc["kind"], rsc["metadata"]["name"]): rsc for rsc in yaml.safe_load_all(rendered.text)
+    }
+    workload = resources["DaemonSet", "cloud-controller-manager"]
+    (container,) = workload["spec"]["template"]["spec"]["containers"]
+    assert "--cluster-name=kubernetes-abcd" in container["args"]
+    cloud_config = resources["ConfigMap", "cloudconfig"]["data"]["cloud.config"]
+    assert "project-id = my-project" in cloud_config
+
+    again = render.render_cluster(fleet / "prod.yaml", {})
+    assert again.digest == rendered.digest
+    tuned = render.render_cluster(fleet / "prod.yaml", {"performance-profile": "large"})
+    assert tuned.digest != rendered.digest
+
+
+def test_render_cluster_incomplete(fleet):
+    rendered = render.render_cluster(fleet / "incomplete.yaml", {})
+    assert rendered.error == "Provider manifests waiting for definition of cluster-name"
+    assert not rendered.digest
+
+
+def test_main(fleet, tmp_path, capsys):
+    output = tmp_path / "rendered"
+    assert render.main([str(fleet), "--jobs", "2", "--output", str(output)]) == 1
+    out, err = capsys.readouterr()
+    (line,) = out.splitlines()
+    digest, cluster = line.split()
+    assert cluster == "prod"
+    assert digest == render.render_cluster(fleet / "prod.yaml", {}).digest
+    assert err == "incomplete: Provider manifests waiting for definition of cluster-name\n"
+    assert [p.name for p in output.iterdir()] == ["prod.yaml"]
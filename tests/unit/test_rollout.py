@@ -0,0 +1,149 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+import threading
+import unittest.mock as mock
+
+import pytest
+from lightkube import Client
+from lightkube.codecs import from_dict
+from lightkube.models.apps_v1 import (
+    DaemonSetSpec,
+    DaemonSetStatus,
+    DeploymentSpec,
+    DeploymentStatus,
+)
+from lightkube.models.core_v1 import PodCondition, PodStatus
+from lightkube.models.meta_v1 import LabelSelector, ObjectMeta
+from lightkube.resources.apps_v1 import DaemonSet, Deployment
+from lightkube.resources.core_v1 import Pod
+from ops.manifests import HashableResource, ManifestClientError
+
+from rollout import RolloutTracker
+
+
+def _daemonset(desired, updated, available, generation=2, observed=2):
+    return DaemonSet(
+        kind="DaemonSet",
+        metadata=ObjectMeta(name="cloud-controller-manager", generation=generation),
+        spec=DaemonSetSpec(selector=None, template=None),
+        status=DaemonSetStatus(
+            currentNumberScheduled=desired,
+            desiredNumberScheduled=desired,
+            numberMisscheduled=0,
+            numberReady=available,
+            numberAvailable=available,
+            updatedNumberScheduled=updated,
+            observedGeneration=observed,
+        ),
+    )
+
+
+@pytest.fixture()
+def tracker():
+    manifests = mock.MagicMock()
+    yield RolloutTracker(manifests, timeout=1.0)
+
+
+def _track(tracker, *states):
+    tracker.manifests.client.watch.return_value = [("MODIFIED", obj) for obj in states]
+    return tracker.track(HashableResource(states[0]))
+
+
+def test_rollout_complete(tracker):
+    progress = _track(
+        tracker,
+        _daemonset(3, 3, 3, observed=1),
+        _daemonset(3, 2, 2),
+        _daemonset(3, 3, 3),
+    )
+    assert progress.complete
+    assert str(progress) == "3/3 updated"
+    assert progress.elapsed is not None
+
+
+def test_rollout_incomplete(tracker):
+    progress = _track(tracker, _daemonset(3, 1, 2))
+    assert not progress.complete
+    assert str(progress) == "1/3 updated"
+
+
+def test_rollout_unscheduled(tracker):
+    progress = _track(tracker, _daemonset(0, 0, 0))
+    assert progress.unscheduled
+    assert not progress.complete
+
+
+def test_rollout_stalled_watch_times_out(tracker):
+    stall = threading.Event()
+
+    def stalled(*_, **__):
+        yield "ADDED", _daemonset(3, 1, 1)
+        stall.wait(timeout=2.0)
+
+    tracker.manifests.client.watch.side_effect = stalled
+    tracker.timeout = 0.1
+    progress = tracker.track(HashableResource(_daemonset(3, 1, 1)))
+    stall.set()
+    assert str(progress) == "1/3 updated"
+
+
+def test_rollout_no_events(tracker):
+    tracker.manifests.client.watch.return_value = []
+    progress = tracker.track(HashableResource(_daemonset(3, 1, 1)))
+    assert not progress.seen and not progress.complete and not progress.unscheduled
+    assert str(progress) == "progress unknown"
+
+
+def _deployment(available):
+    return Deployment(
+        kind="Deployment",
+        metadata=ObjectMeta(name="cloud-controller-manager", namespace="kube-system"),
+        spec=DeploymentSpec(
+            replicas=2, selector=LabelSelector(matchLabels={"app": "ccm"}), template=None
+        ),
+        status=DeploymentStatus(replicas=2, updatedReplicas=2, availableReplicas=available),
+    )
+
+
+def _pod(reason):
+    scheduled = PodCondition(status="False", type="PodScheduled", reason=reason)
+    return Pod(status=PodStatus(conditions=[scheduled]))
+
+
+@pytest.mark.parametrize(
+    "available, reasons, unscheduled, short_of_nodes",
+    [
+        (0, ["Unschedulable", "Unschedulable"], True, False),
+        (0, ["Unschedulable", None], False, False),
+        (1, ["Unschedulable", None], False, True),
+        (1, [None, None], False, False),
+    ],
+)
+def test_deployment_unscheduled(tracker, available, reasons, unscheduled, short_of_nodes):
+    tracker.manifests.client.list.return_value = [_pod(reason) for reason in reasons]
+    progress = _track(tracker, _deployment(available))
+    assert progress.unscheduled is unscheduled
+    assert progress.short_of_nodes is short_of_nodes
+    tracker.manifests.client.list.assert_called_once_with(
+        Pod, namespace="kube-system", labels={"app": "ccm"}
+    )
+
+
+def test_rollout_watch_error(tracker, api_error_klass):
+    tracker.manifests.client.watch.side_effect = api_error_klass
+    with pytest.raises(ManifestClientError):
+        tracker.track(HashableResource(_daemonset(3, 1, 1)))
+
+
+def test_track_against_api_server(kube_api):
+    manifests = mock.MagicMock()
+    manifests.client = Client(config=kube_api.config)
+    metadata = {"name": "cloud-controller-manager", "namespace": "kube-system"}
+    daemonset = {"apiVersion": "apps/v1", "kind": "DaemonSet", "metadata": metadata, "spec": {}}
+    kube_api.ready_nodes = 3
+    kube_api.add(daemonset)
+
+    rsc = HashableResource(from_dict(daemonset))
+    progress = RolloutTracker(manifests, timeout=5.0).track(rsc)
+    assert progress.complete and str(progress) == "3/3 updated"
+    assert kube_api.count("GET", "/daemonsets") == 1
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Render the provider manifests of a fleet of clusters, without juju or a cluster.
+
+Each cluster is described by a yaml file, named for the cluster:
+
+    config:                 # charm config, unset options take their defaults
+      provider-release: v0.27.1
+    kube-control:
+      registry: rocks.canonical.com/cdk
+      labels: ["node-role.kubernetes.io/control-plane="]
+      taints: ["node-role.kubernetes.io/control-plane:NoSchedule"]
+      cluster-tag: kubernetes-4ypskxahbu3rnfgsds3pksvwe3uh0lxt
+      application: kubernetes-control-plane
+    credentials: '{"project_id": "my-project"}'
+    node-count: 12          # sizes the auto performance-profile
+    metrics: false          # whether the metrics-endpoint relation is joined
+
+It imports the charm's modules, so run it with src on the path: tox -e render -- <dir>
+"""
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from hashlib import sha256
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Mapping, Optional
+
+import yaml
+from lightkube.codecs import dump_all_yaml
+from lightkube.models.core_v1 import Toleration
+
+from config import CharmConfig
+from provider_manifests import METRICS_RELATION, GCPProviderManifests
+
+log = logging.getLogger(__name__)
+CHARM_DIR = Path(__file__).parent.parent
+APP_NAME = "gcp-cloud-provider"
+CREDENTIALS_PLACEHOLDER = '{"project_id": "placeholder"}'
+
+
+class RenderError(Exception):
+    """Raised when a cluster description can't be rendered."""
+
+
+def charm_defaults() -> Dict[str, Any]:
+    """Defaults of every charm config option."""
+    options = yaml.safe_load((CHARM_DIR / "config.yaml").read_text())["options"]
+    return {key: option.get("default") for key, option in options.items()}
+
+
+def _taint(text: str) -> Toleration:
+    key, _, effect = text.rpartition(":")
+    key, _, value = key.partition("=")
+    if not (key and effect):
+        raise RenderError(f"Invalid taint {text}")
+    return Toleration(key=key, value=value or None, effect=effect)
+
+
+def _label(text: str) -> SimpleNamespace:
+    key, sep, value = text.partition("=")
+    if not (key and sep):
+        raise RenderError(f"Invalid label {text}")
+    return SimpleNamespace(key=key, value=value)
+
+
+class OfflineKubeControl:
+    """Answers the kube-control queries of the manifests from a cluster description."""
+
+    def __init__(self, data: Mapping[str, Any]):
+        self.is_ready = True
+        self.data = data
+        self.relation = SimpleNamespace(
+            app=SimpleNamespace(name=data.get("application", "kubernetes-control-plane"))
+        )
+
+    def get_registry_location(self) -> str:
+        """Image registry of the cluster."""
+        return self.data.get("registry", "rocks.canonical.com/cdk")
+
+    def get_controller_taints(self) -> List[Toleration]:
+        """Taints of the control-plane nodes."""
+        return [_taint(text) for text in self.data.get("taints", [])]
+
+    def get_controller_labels(self) -> List[SimpleNamespace]:
+        """Labels of the control-plane nodes."""
+        return [_label(text) for text in self.data.get("labels", [])]
+
+    def get_cluster_tag(self) -> Optional[str]:
+        """Tag identifying the cluster."""
+        return self.data.get("cluster-tag")
+
+
+@dataclass
+class Rendered:
+    """The rendered manifests of a cluster, or why they couldn't be rendered."""
+
+    cluster: str
+    digest: str = ""
+    text: str = ""
+    error: str = ""
+
+
+def offline_manifests(
+    description: Mapping[str, Any], overrides: Mapping[str, Any]
+) -> GCPProviderManifests:
+    """The manifests the charm would build for the described cluster."""
+    config = {**charm_defaults(), **description.get("config", {}), **overrides}
+    relations = {METRICS_RELATION: [True]} if description.get("metrics") else {}
+    charm = SimpleNamespace(
+        config=config,
+        model=SimpleNamespace(app=SimpleNamespace(name=APP_NAME), relations=relations),
+    )
+    charm_config = CharmConfig(charm)
+    if msg := charm_config.evaluate():
+        raise RenderError(msg)
+    integrator = SimpleNamespace(
+        is_ready=True, credentials=description.get("credentials", CREDENTIALS_PLACEHOLDER)
+    )
+    kube_control = OfflineKubeControl(description.get("kube-control", {}))
+    manifests = GCPProviderManifests(charm, charm_config, integrator, kube_control)
+    # without a cluster to count, sized the same as a cluster which can't be queried
+    manifests.node_count = description.get("node-count")
+    manifests.resize = True
+    return manifests
+
+
+def render_cluster(path: Path, overrides: Mapping[str, Any]) -> Rendered:
+    """Render the manifests of the cluster described at path."""
+    cluster = path.stem
+    try:
+        description = yaml.safe_load(path.read_text()) or {}
+        manifests = offline_manifests(description, overrides)
+        if msg := manifests.evaluate():
+            raise RenderError(msg)
+        text = dump_all_yaml([rsc.resource for rsc in manifests.resources]) or ""
+    except (OSError, yaml.YAMLError, RenderError) as e:
+        return Rendered(cluster, error=str(e))
+    return Rendered(cluster, sha256(text.encode()).hexdigest(), text)
+
+
+def _render(args) -> Rendered:
+    return render_cluster(*args)
+
+
+def render_fleet(
+    paths: List[Path], overrides: Mapping[str, Any], jobs: Optional[int] = None
+) -> List[Rendered]:
+    """Render every described cluster across a pool of processes, in the order of paths."""
+    # manifests are found relative to the charm, like a dispatch from the charm directory
+    paths = [path.resolve() for path in paths]
+    with ProcessPoolExecutor(jobs, initializer=os.chdir, initargs=(CHARM_DIR,)) as pool:
+        return list(pool.map(_render, [(path, overrides) for path in paths]))
+
+
+def _override(text: str) -> Dict[str, Any]:
+    key, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected key=value, got {text}")
+    return {key: yaml.safe_load(value)}
+
+
+def get_argparser():
+    """Build the argparse instance."""
+    parser = argparse.ArgumentParser(
+        description="Render the provider manifests of every described cluster.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument("clusters", type=Path, help="Directory of cluster descriptions.")
+    parser.add_argument(
+        "--set",
+        dest="overrides",
+        type=_override,
+        action="append",
+        default=[],
+        help="Charm config applied to every cluster.\n\n"
+        "example\n"
+        "  --set provider-release=v0.27.1\n",
+    )
+    parser.add_argument(
+        "--output", type=Path, help="Directory where the manifests of each cluster are written."
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=None, help="Number of processes, defaults to the cpu count."
+    )
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Print the digest of each cluster's manifests, returning non-zero if any failed."""
+    args = get_argparser().parse_args(argv)
+    overrides = {key: value for override in args.overrides for key, value in override.items()}
+    paths = sorted(path for ext in ("yaml", "yml") for path in args.clusters.glob(f"*.{ext}"))
+    failed = 0
+    for rendered in render_fleet(paths, overrides, args.jobs):
+        if rendered.error:
+            failed += 1
+            print(f"{rendered.cluster}: {rendered.error}", file=sys.stderr)
+            continue
+        print(f"{rendered.digest}  {rendered.cluster}")
+        if args.output:
+            args.output.mkdir(parents=True, exist_ok=True)
+            (args.output / f"{rendered.cluster}.yaml").write_text(rendered.text)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main())
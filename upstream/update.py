@@ -40,6 +40,7 @@ SOURCES = dict(
     ),
 )
 FILEDIR = Path(__file__).parent
+DIGESTS = "digests.yaml"
 VERSION_RE = re.compile(rf"^{TAG_PREFIX}v[0]\.\d+\.\d+")
 IMG_RE = re.compile(r"^\s+image:\s+(\S+)")
 
@@ -112,6 +113,7 @@ def main(source: str, registry: Optional[Registry]):
         local_releases.add(download(source, release))
     unique_releases = list(dict.fromkeys(accumulate((sorted(local_releases)), dedupe)))
     all_images = set(image for release in unique_releases for image in images(release))
+    record_digests(source, unique_releases)
     if registry:
         mirror_image(all_images, registry)
     return unique_releases[-1].name, all_images
@@ -190,6 +192,40 @@ def images(release: Release) -> Generator[str, None, None]:
                 yield m.groups()[0]
 
 
+def image_digest(image: str) -> Optional[str]:
+    """Resolve the digest an image tag currently references."""
+    try:
+        proc = subprocess.run(
+            ["./regctl", "image", "digest", image],
+            capture_output=True,
+            check=True,
+            encoding="utf-8",
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        log.warning(f"Cannot resolve digest of {image}: {e}")
+        return None
+    return proc.stdout.strip()
+
+
+def record_digests(source: str, releases: List[Release]):
+    """Record the image digests of releases which have none recorded.
+
+    Digests of releases already recorded are kept, since their tags may have moved.
+    """
+    path = FILEDIR / source / DIGESTS
+    recorded = (yaml.safe_load(path.read_text()) if path.exists() else None) or {}
+    digests = {}
+    for release in releases:
+        if release.name in recorded:
+            digests[release.name] = recorded[release.name]
+            continue
+        pinned = {image: digest for image in images(release) if (digest := image_digest(image))}
+        if pinned:
+            digests[release.name] = pinned
+    if digests:
+        path.write_text(yaml.safe_dump(digests))
+
+
 def mirror_image(images: List[str], registry: Registry):
     """Synchronize all source images to target registry, only pushing changed layers."""
     sync_config = SyncConfig(
@@ -228,7 +264,8 @@ def get_argparser():
         "\n"
         "Mirroring depends on binary regsync "
         "(https://github.com/regclient/regclient/releases)\n"
-        "and that it is available in the current working directory",
+        "and that it is available in the current working directory.\n"
+        "Image digests are recorded with binary regctl from the same place",
     )
     parser.add_argument(
         "--sources",